@@ -0,0 +1,67 @@
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from loader.market_loader import MARKET_PATH, write_market_parquet
+
+
+def _synthetic(n: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+    spread = np.abs(rng.normal(0, 0.003, n)) * close
+    return pd.DataFrame({
+        "datetime": pd.date_range("2018-01-02 14:30", periods=n, freq="15min", tz="UTC"),
+        "open": close,
+        "high": close + spread,
+        "low": close - spread,
+        "close": close,
+        "volume": rng.integers(100, 100000, n).astype(np.float64),
+    })
+
+
+def _best_of(fn, runs: int) -> float:
+    best = float("inf")
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Кодеки/row group OHLC parquet: размер, полное и оконное чтение")
+    parser.add_argument("--symbol", type=str, default=None, help="файл из data/ohlc, иначе синтетика")
+    parser.add_argument("--bars", type=int, default=200000)
+    parser.add_argument("--codecs", type=str, default="zstd,lz4,none")
+    parser.add_argument("--row_group", type=int, default=8192)
+    parser.add_argument("--window_days", type=int, default=5, help="окно сделки: entry .. exit deadline")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.symbol:
+        df = pd.read_parquet(MARKET_PATH / f"{args.symbol}.parquet", engine="pyarrow")
+    else:
+        df = _synthetic(args.bars)
+
+    mid = df["datetime"].iat[len(df) // 2]
+    window = [("datetime", ">=", mid), ("datetime", "<=", mid + pd.Timedelta(days=args.window_days))]
+    print(f"{len(df)} bars, row group {args.row_group}, window {args.window_days}d")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for codec in [c.strip() for c in args.codecs.split(",") if c.strip()]:
+            path = Path(tmp) / f"{codec}.parquet"
+            write_s = _best_of(lambda: write_market_parquet(df, path, codec=codec, row_group_size=args.row_group), 1)
+            full_s = _best_of(lambda: pd.read_parquet(path, engine="pyarrow"), args.runs)
+            win_s = _best_of(lambda: pd.read_parquet(path, engine="pyarrow", filters=window), args.runs)
+            print(
+                f"{codec:6}: {path.stat().st_size / 2**20:8.2f} MiB, write {write_s * 1e3:8.1f} ms, "
+                f"full read {full_s * 1e3:8.1f} ms, window read {win_s * 1e3:8.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from loader.indicator_kernels import ema_many, rsi_many, rsi_sma_many, atr_many
+from config.params import EMA_FAST_SPACE, EMA_SLOW_SPACE, RSI_PERIOD_SPACE
+
+
+def _synthetic(n: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+    spread = np.abs(rng.normal(0, 0.003, n)) * close
+    return close + spread, close - spread, close
+
+
+def _reference(high, low, close, spans, periods, windows):
+    import ta
+
+    s = pd.Series(close)
+    ema = np.column_stack([s.ewm(span=p, adjust=False).mean().to_numpy() for p in spans])
+    rsi = np.column_stack([ta.momentum.RSIIndicator(s, p).rsi().to_numpy() for p in periods])
+    # rolling-RSI из loader/indicators.py
+    d = s.diff()
+    up, dn = d.clip(lower=0), -d.clip(upper=0)
+    rsi_sma = np.column_stack([(100 - 100 / (1 + up.rolling(p).mean() / dn.rolling(p).mean())).to_numpy() for p in periods])
+
+    h, l = pd.Series(high), pd.Series(low)
+    tr = pd.concat([h - l, (h - s.shift()).abs(), (l - s.shift()).abs()], axis=1).max(axis=1)
+    atr = np.column_stack([tr.rolling(w).mean().to_numpy() for w in windows])
+    return ema, rsi, rsi_sma, atr
+
+
+def _max_diff(a, b) -> float:
+    if not np.array_equal(np.isnan(a), np.isnan(b)):
+        return float("inf")
+    ok = ~np.isnan(a)
+    return float(np.max(np.abs(a[ok] - b[ok]))) if ok.any() else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сверка numba-индикаторов с pandas/ta и замер скорости")
+    parser.add_argument("--bars", type=int, default=20000)
+    parser.add_argument("--tol", type=float, default=1e-8)
+    args = parser.parse_args()
+
+    lo, hi, step = EMA_FAST_SPACE
+    spans = list(range(lo, hi + 1, step))
+    lo, hi, step = EMA_SLOW_SPACE
+    spans += list(range(lo, hi + 1, step))
+    lo, hi, step = RSI_PERIOD_SPACE
+    periods = list(range(lo, hi + 1, step))
+    windows = [7, 14, 21]
+
+    high, low, close = _synthetic(args.bars)
+
+    # первый вызов — компиляция/загрузка кэша numba
+    ema_many(close, np.array(spans, dtype=np.int64))
+    rsi_many(close, np.array(periods, dtype=np.int64))
+    rsi_sma_many(close, np.array(periods, dtype=np.int64))
+    atr_many(high, low, close, np.array(windows, dtype=np.int64))
+
+    t0 = time.perf_counter()
+    ema = ema_many(close, np.array(spans, dtype=np.int64))
+    rsi = rsi_many(close, np.array(periods, dtype=np.int64))
+    rsi_sma = rsi_sma_many(close, np.array(periods, dtype=np.int64))
+    atr = atr_many(high, low, close, np.array(windows, dtype=np.int64))
+    t_kernels = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    ref_ema, ref_rsi, ref_rsi_sma, ref_atr = _reference(high, low, close, spans, periods, windows)
+    t_ref = time.perf_counter() - t0
+
+    print(f"bars: {args.bars}, ema spans: {len(spans)}, rsi periods: {len(periods)}, atr windows: {len(windows)}")
+    print(f"numba kernels : {t_kernels:.4f}s")
+    print(f"pandas / ta   : {t_ref:.4f}s")
+
+    ok = True
+    for name, a, b in (("ema", ema, ref_ema), ("rsi", rsi, ref_rsi), ("rsi_sma", rsi_sma, ref_rsi_sma), ("atr", atr, ref_atr)):
+        diff = _max_diff(a, b)
+        ok &= diff <= args.tol
+        print(f"{name:7} max |diff|: {diff:.3e}")
+
+    if not ok:
+        raise SystemExit(f"Kernels differ from pandas/ta by more than {args.tol}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# Выполняется в свежем процессе: импорт + первый вызов batch-ядра на синтетических барах
+_PROBE = r"""
+import json, time
+t0 = time.perf_counter()
+
+import numpy as np
+from numba.typed import List
+from core.baskets import backtest  # noqa: F401  (полный импорт-граф run_single)
+from core.simulator import build_touch_tables, simulate_trades_batch, simulate_trades_batch_parallel
+
+t_import = time.perf_counter() - t0
+
+n = 2000
+dt_ns = np.arange(n, dtype=np.int64) * 900_000_000_000
+close = 100.0 + np.cumsum(np.sin(np.arange(n) * 0.1))
+ohlc = np.ascontiguousarray(np.column_stack([close, close + 0.5, close - 0.5, close]))
+hi_table, lo_table = build_touch_tables(ohlc)
+
+kernel = simulate_trades_batch_parallel if {parallel} else simulate_trades_batch
+zeros = np.zeros(1, dtype=np.int64)
+kernel(
+    List([dt_ns]), List([ohlc]), List([hi_table]), List([lo_table]),
+    zeros, np.full(1, 10, dtype=np.int64),
+    np.full(1, dt_ns[500], dtype=np.int64), np.ones(1, dtype=np.int64),
+    2.0, 4.0, False, 0.02, 0.2, False, 2.0, 0.0004, 0.02,
+)
+
+print(json.dumps({{"import_s": t_import, "first_trade_s": time.perf_counter() - t0}}))
+"""
+
+
+def _run_probe(parallel: bool) -> dict:
+    t0 = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(parallel=parallel)],
+        cwd=Path(__file__).resolve().parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    res = json.loads(out.stdout.strip().splitlines()[-1])
+    res["process_s"] = time.perf_counter() - t0
+    return res
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время старта процесса до первой сделки")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--serial", action="store_true", help="замерять последовательное ядро вместо prange")
+    args = parser.parse_args()
+
+    # первый прогон заполняет кэш numba (__pycache__/*.nbi|*.nbc), если его ещё нет;
+    # следующие показывают тёплый старт
+    for i in range(args.runs):
+        res = _run_probe(parallel=not args.serial)
+        label = "first" if i == 0 else "repeat"
+        print(
+            f"run {i + 1} ({label}): import {res['import_s']:.3f}s, "
+            f"time-to-first-trade {res['first_trade_s']:.3f}s, process {res['process_s']:.3f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,21 @@ DEFAULT_INDICATOR_CONFIG: IndicatorConfig = {
     "volume": [False],
 }
 
+# пространство поиска индикаторов в Optuna: (min, max, step) — его же прогревает indicator bank
+EMA_FAST_SPACE = (10, 30, 5)
+EMA_SLOW_SPACE = (40, 120, 5)
+RSI_PERIOD_SPACE = (12, 21, 3)
+
+def _space_values(space) -> list[int]:
+    lo, hi, step = space
+    return list(range(int(lo), int(hi) + 1, int(step)))
+
+def indicator_search_columns() -> list[str]:
+    """Все колонки индикаторов, которые может запросить build_optuna_params."""
+    emas = sorted(set(_space_values(EMA_FAST_SPACE)) | set(_space_values(EMA_SLOW_SPACE)))
+    rsis = _space_values(RSI_PERIOD_SPACE)
+    return [f"ema_{p}" for p in emas] + [f"rsi_{p}" for p in rsis]
+
 def _copy_default_indicator_config() -> IndicatorConfig:
     return {k: list(v) for k, v in DEFAULT_INDICATOR_CONFIG.items()}
 
@@ -38,6 +53,11 @@ class StrategyParams:
     # --- market ---
     bar_minutes: int = 15
 
+    # --- execution ---
+    # потоки numba для batch-симуляции: 0 — все ядра, 1 — последовательно, N — не больше N;
+    # единственное место с умолчанием (CLI и сборщики params берут его отсюда)
+    threads: int = 0
+
     # --- execution costs ---
     commission: float = 0.02
     # Слиппедж: доля цены (0.0004 = 4 bps)
@@ -97,6 +117,7 @@ def build_single_params(args: Any) -> StrategyParams:
         commission=float(getattr(args, "commission", 0.02)),
         slippage=float(getattr(args, "slippage", 0.0004)),
         bar_minutes=int(getattr(args, "bar_minutes", 15)),
+        threads=int(getattr(args, "threads", StrategyParams.threads)),
     )
 
 def build_optuna_params(trial, args: Any) -> StrategyParams:
@@ -141,8 +162,8 @@ def build_optuna_params(trial, args: Any) -> StrategyParams:
         ema_enabled = trial.suggest_categorical("ema_enabled", [False, True])
         if ema_enabled:
             ema_sign = trial.suggest_categorical("ema_sign", ["above", "below"])
-            ema_fast = trial.suggest_int("ema_fast", 10, 30, step=5)
-            ema_slow = trial.suggest_int("ema_slow", 40, 120, step=5)
+            ema_fast = trial.suggest_int("ema_fast", EMA_FAST_SPACE[0], EMA_FAST_SPACE[1], step=EMA_FAST_SPACE[2])
+            ema_slow = trial.suggest_int("ema_slow", EMA_SLOW_SPACE[0], EMA_SLOW_SPACE[1], step=EMA_SLOW_SPACE[2])
             if ema_fast >= ema_slow:
                 ema_fast = max(5, min(int(ema_fast), int(ema_slow) - 1))
             indicator_config["ema"] = [True, ema_sign, int(ema_fast), int(ema_slow)]
@@ -156,7 +177,7 @@ def build_optuna_params(trial, args: Any) -> StrategyParams:
         rsi_enabled = trial.suggest_categorical("rsi_enabled", [False, True])
         if rsi_enabled:
             rsi_sign = trial.suggest_categorical("rsi_sign", ["above", "below"])
-            rsi_period = trial.suggest_int("rsi_period", 12, 21, step=3)
+            rsi_period = trial.suggest_int("rsi_period", RSI_PERIOD_SPACE[0], RSI_PERIOD_SPACE[1], step=RSI_PERIOD_SPACE[2])
             rsi_level = trial.suggest_int("rsi_level", 20, 80, step=10)
             indicator_config["rsi"] = [True, rsi_sign, int(rsi_level), int(rsi_period)]
     else:
@@ -180,4 +201,5 @@ def build_optuna_params(trial, args: Any) -> StrategyParams:
         commission=float(getattr(args, "commission", 0.02)),
         slippage=float(getattr(args, "slippage", 0.0004)),
         bar_minutes=int(getattr(args, "bar_minutes", 15)),
+        threads=int(getattr(args, "threads", StrategyParams.threads)),
     )
@@ -1,40 +1,208 @@
-import pandas as pd
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
+from loader import bar_store, market_index, panel_store
+from loader.market_loader import OHLC_CODEC, OHLC_ROW_GROUP
+
 CSV_DIR = Path("data/market")
 PARQUET_DIR = Path("data/ohlc")
 PARQUET_DIR.mkdir(parents=True, exist_ok=True)
 
-def convert_csv_to_parquet():
-    csv_files = list(CSV_DIR.glob("*.csv"))
+# блок потокового чтения CSV (байт): память воркера ~ блок, а не весь файл
+BLOCK_SIZE = 16 << 20
+
+def _column_types():
+    import pyarrow as pa
+
+    # явные типы: без вывода типов по первому блоку и без object-колонок
+    return {
+        "timestamp": pa.int64(),
+        "open": pa.float64(),
+        "high": pa.float64(),
+        "low": pa.float64(),
+        "close": pa.float64(),
+        "volume": pa.float64(),
+    }
+
+def _to_canonical(batch):
+    """timestamp (ms) → datetime UTC (ns) первой колонкой, остальные как в CSV."""
+    import pyarrow as pa
+
+    names = batch.schema.names
+    if "timestamp" not in names:
+        raise ValueError(f"Нет колонки timestamp, колонки: {names}")
+    dt = batch.column(names.index("timestamp")).cast(pa.timestamp("ms", tz="UTC")).cast(pa.timestamp("ns", tz="UTC"))
+    cols = [col for col in names if col not in ("timestamp", "datetime")]
+    return pa.Table.from_arrays([dt] + [batch.column(names.index(c)) for c in cols], names=["datetime"] + cols)
+
+def _narrow(col):
+    """Колонка вне _column_types, прочитанная строками, — к int64/float64 по всему файлу, если получается."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    for target in (pa.int64(), pa.float64()):
+        try:
+            return pc.cast(col, target)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            continue
+    return col
+
+def _read_whole(csv_path: str, read_options, parse_options):
+    """Весь CSV одной таблицей: типы лишних колонок выводятся по всему файлу, а не по первой пачке."""
+    import pyarrow as pa
+    import pyarrow.csv as pcsv
+
+    types = _column_types()
+    names = pcsv.open_csv(csv_path, read_options=read_options, parse_options=parse_options).schema.names
+    extras = [c for c in names if c not in types]
+    convert_options = pcsv.ConvertOptions(column_types={**types, **{c: pa.string() for c in extras}})
+    table = pcsv.read_csv(csv_path, read_options=read_options, parse_options=parse_options,
+                          convert_options=convert_options)
+    for c in extras:
+        table = table.set_column(table.schema.get_field_index(c), c, _narrow(table.column(c)))
+    return table
+
+def _is_sorted(dt) -> bool:
+    import pyarrow.compute as pc
+
+    if len(dt) < 2:
+        return True
+    return bool(pc.all(pc.greater_equal(dt[1:], dt[:-1])).as_py())
+
+def convert_file(csv_path: str, out_path: str, block_size: int = BLOCK_SIZE) -> tuple[int, float, str]:
+    """
+    Один CSV → parquet (запускается в процессе пула). Потоковое чтение пачками и запись
+    row group'ами; типы колонок вне _column_types reader фиксирует по первой пачке.
+    Если данные не по возрастанию времени или поздняя пачка не подходит под эти типы —
+    чтение целиком (сортировка, типы по всему файлу). Временный файл удаляется при любой ошибке.
+    Возвращает (строк, секунд, hash файла для market_index — считается по ходу записи).
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pcsv
+    import pyarrow.parquet as pq
+
+    t0 = time.perf_counter()
+    read_options = pcsv.ReadOptions(block_size=block_size)
+    parse_options = pcsv.ParseOptions(delimiter=";")
+    convert_options = pcsv.ConvertOptions(column_types=_column_types())
+
+    out = Path(out_path)
+    tmp = out.with_suffix(f".{os.getpid()}.tmp")
+    codec = None if OHLC_CODEC == "none" else OHLC_CODEC
+    rows = 0
+    streamed = True
+    last = None
+    replaced = False
+
+    try:
+        reader = pcsv.open_csv(csv_path, read_options=read_options, parse_options=parse_options,
+                               convert_options=convert_options)
+        sink = market_index.HashingFile(tmp)
+        writer = None
+        try:
+            for batch in reader:
+                table = _to_canonical(batch)
+                if table.num_rows == 0:
+                    continue
+                dt = table.column("datetime").combine_chunks()
+                if not _is_sorted(dt) or (last is not None and dt[0].value < last):
+                    # обязательное условие хранилища — бары по возрастанию времени
+                    streamed = False
+                    break
+                last = dt[-1].value
+                if writer is None:
+                    writer = pq.ParquetWriter(sink, table.schema, compression=codec, write_statistics=True)
+                writer.write_table(table, row_group_size=OHLC_ROW_GROUP)
+                rows += table.num_rows
+        except pa.ArrowInvalid:
+            # тип лишней колонки, выведенный по первой пачке, не подходит дальше (null → строка, int → float)
+            streamed = False
+        finally:
+            if writer is not None:
+                writer.close()
+            sink.close()
+
+        if not streamed:
+            table = _to_canonical(_read_whole(csv_path, read_options, parse_options)).sort_by("datetime")
+            with market_index.HashingFile(tmp) as sink:
+                pq.write_table(table, sink, compression=codec, row_group_size=OHLC_ROW_GROUP, write_statistics=True)
+            rows = table.num_rows
+        elif writer is None:
+            raise ValueError("пустой файл")
+
+        os.replace(tmp, out)
+        replaced = True
+    finally:
+        if not replaced:
+            tmp.unlink(missing_ok=True)
+    return rows, time.perf_counter() - t0, sink.hexdigest()
+
+def _is_fresh(csv_file: Path, out_path: Path) -> bool:
+    return out_path.exists() and out_path.stat().st_mtime_ns >= csv_file.stat().st_mtime_ns
+
+def convert_csv_to_parquet(workers: int | None = None, force: bool = False, block_size: int = BLOCK_SIZE) -> dict:
+    csv_files = sorted(CSV_DIR.glob("*.csv"))
     print(f"Найдено {len(csv_files)} CSV файлов")
 
+    todo = []
+    skipped = 0
     for csv_file in csv_files:
-        try:
-            path = csv_file.relative_to(CSV_DIR)
-            df = pd.read_csv(CSV_DIR / path, sep=";")
-
-            # timestamp (ms) → datetime UTC
-            df["datetime"] = pd.to_datetime(df["timestamp"], unit="ms", utc=True)
-
-            # канонический порядок колонок
-            cols = ['datetime'] + [col for col in df.columns if col != 'timestamp' and col != 'datetime']
-            df = df[cols]
-
-            # обязательные условия
-            df.sort_values("datetime", inplace=True)
-            df.reset_index(drop=True, inplace=True)
-
-            df.to_parquet(
-                PARQUET_DIR / path.with_suffix(".parquet"),
-                engine="pyarrow",
-                compression="zstd"
-            )
-        except Exception as e:
-            print(f"Ошибка при конвертации {csv_file}: {e}")
+        out_path = PARQUET_DIR / csv_file.relative_to(CSV_DIR).with_suffix(".parquet")
+        if not force and _is_fresh(csv_file, out_path):
+            skipped += 1
             continue
+        todo.append((csv_file, out_path))
 
-    print(f"Saved {PARQUET_DIR}")
+    t0 = time.perf_counter()
+    converted, failures = [], []
+    total_rows = 0
+    workers = workers or os.cpu_count() or 1
+    if todo:
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+            futures = {
+                pool.submit(convert_file, str(csv_file), str(out_path), block_size): (csv_file, out_path)
+                for csv_file, out_path in todo
+            }
+            for fut in as_completed(futures):
+                csv_file, out_path = futures[fut]
+                try:
+                    rows, _, digest = fut.result()
+                except Exception as e:
+                    failures.append((csv_file.name, str(e)))
+                    continue
+                total_rows += rows
+                converted.append((out_path, digest))
+
+    # индекс и панель пишет только главный процесс: записи по футерам и hash воркеров, файл индекса — один раз
+    for out_path, digest in converted:
+        market_index.refresh(out_path.stem, out_path, digest)
+    market_index.flush()
+    if bar_store.BAR_BACKEND == "panel" and converted:
+        print(f"Panel: {panel_store.build_from_parquet([p.stem for p, _ in converted], force=True)}")
+
+    seconds = time.perf_counter() - t0
+    summary = {
+        "converted": len(converted),
+        "skipped": skipped,
+        "failed": len(failures),
+        "rows": total_rows,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(total_rows / seconds) if seconds > 0 else 0,
+    }
+    print(f"Saved {PARQUET_DIR}: {summary}")
+    for name, err in failures:
+        print(f"Ошибка при конвертации {name}: {err}")
+    return summary
 
 if __name__ == "__main__":
-    convert_csv_to_parquet()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="CSV (;) → parquet для data/ohlc")
+    parser.add_argument("--workers", type=int, default=None, help="процессов, по умолчанию все ядра")
+    parser.add_argument("--force", action="store_true", help="конвертировать и файлы с актуальным parquet")
+    parser.add_argument("--block_size", type=int, default=BLOCK_SIZE, help="байт на пачку потокового чтения")
+    args = parser.parse_args()
+
+    summary = convert_csv_to_parquet(workers=args.workers, force=args.force, block_size=args.block_size)
+    raise SystemExit(1 if summary["failed"] else 0)
@@ -1,69 +1,217 @@
-import time
+import numpy as np
 import pandas as pd
 
 
-from loader.ensure_data import ensure_market_data
-from core.simulator import simulate_trade, LONG, SHORT
-from core.market_time import build_market_cache
+from loader.ensure_data import ensure_market_arrays
+from loader.signals import as_signal_table
+from core.simulator import (
+    prepare_entry, jobs_to_columns, simulate_batch, simulate_batch_grid,
+    validate_jobs, take_jobs, LONG, SHORT,
+)
+from core.market_time import build_market_cache, add_market_minutes_cached_many
+from core.filters import compile_filters, filter_key
+from core.entry_cache import EntryCache
 
 
-def backtest(signals, params):
-    trades = []
-    signal_stats = []
-    start_time = time.time()
+def _symbol_mask(symbol, columns, bars, predicate, f_key, masks):
+    n = bars[0].shape[0]
+    if masks is None:
+        return predicate(columns, n)
+    cached = masks.get((symbol, f_key))
+    # маска валидна, пока бары символа те же (файл не перезаписан)
+    if cached is not None and cached[0] is bars[0]:
+        return cached[1]
+    mask = predicate(columns, n)
+    masks[(symbol, f_key)] = (bars[0], mask)
+    return mask
+
+
+def _plan_entries(signals, params, market_cache, masks=None):
+    """
+    Всё, что не зависит от sl/tp/holding: входы, фильтры, раскладка по сигналам.
+    masks: кэш масок фильтров по символам (EntryCache.masks).
+    Возвращает plan: jobs (колонки), blocks (бары символов), pending (по сигналу: job_ids, rejected).
+    """
+    predicate = compile_filters(params.indicator_config)
+    f_key = filter_key(params.indicator_config)
+
+    # вхождения (сигнал, символ, направление) — строки SignalTable в исходном порядке;
+    # группировка по символу в порядке первого появления
+    codes, uniques = pd.factorize(signals.symbol, sort=False)
+    order = np.argsort(codes, kind="stable")
+    groups = np.split(order, np.cumsum(np.bincount(codes, minlength=len(uniques)))[:-1])
+    occ_signal = signals.signal_id
+    occ_direction = signals.direction
+
+    # symbol-major: каждый символ грузится и готовится один раз на прогон
+    outcome = [None] * len(occ_signal)  # job-dict либо причина отказа
+    blocks = []
+    for symbol, occ_ids in zip(uniques, groups):
+        start = signals.datetime[occ_signal[occ_ids]].min()
+        try:
+            # бары (mmap при npy/panel) и колонки индикаторов — без DataFrame всей истории
+            data = ensure_market_arrays(symbol, start, params.indicator_config)
+            if data is None:
+                for k in occ_ids:
+                    outcome[k] = "no_market_data"
+                continue
+            bars, columns = data
+            mask = _symbol_mask(symbol, columns, bars, predicate, f_key, masks)
+        except Exception as e:
+            # битые бары/индикаторы одного символа — отказ его сделок, а не всего прогона
+            for k in occ_ids:
+                outcome[k] = str(e)
+            continue
+        # блок на каждый загруженный символ (бары как есть, без склейки): не зависит от фильтров трайла
+        block = len(blocks)
+        blocks.append(bars)
+
+        for k in occ_ids.tolist():
+            job = prepare_entry(
+                symbol=symbol,
+                signal_time=signals.datetime[occ_signal[k]],
+                params=params,
+                ohlc=None,
+                direction=(LONG if occ_direction[k] > 0 else SHORT),
+                market_cache=market_cache,
+                filter_mask=mask,
+                dt_ns=bars[0],
+            )
+            if job.get("rejected"):
+                outcome[k] = job["reject_reason"]
+                continue
+
+            job["block"] = block
+            outcome[k] = job
 
-    dts = [pd.Timestamp(s["datetime"]) for s in signals if s.get("datetime") is not None]
-    if dts:
-        dt_min = min(dts)
-        dt_max = max(dts)
+    # раскладка обратно в порядок сигналов
+    jobs = []
+    pending = [([], []) for _ in range(len(signals))]
+    for k, (signal_idx, symbol) in enumerate(zip(occ_signal.tolist(), signals.symbol)):
+        job_ids, rejected = pending[signal_idx]
+        if isinstance(outcome[k], dict):
+            job_ids.append(len(jobs))
+            jobs.append(outcome[k])
+        else:
+            rejected.append((symbol, outcome[k]))
+
+    return {"jobs": jobs_to_columns(jobs), "blocks": blocks, "pending": pending}
+
+
+def _market_cache(signals, holding_minutes: int, delay_open: int):
+    dts = signals.datetime.dropna()
+    if len(dts):
+        dt_min = dts.min()
+        dt_max = dts.max()
     else:
         dt_min = pd.Timestamp.utcnow()
         dt_max = dt_min
 
-    max_minutes = int(getattr(params, "holding_minutes", 0)) + int(getattr(params, "delay_open", 0))
+    max_minutes = int(holding_minutes) + int(delay_open)
     extra_days = max(60, int(max_minutes / 390) * 2 + 30)
 
-    market_cache = build_market_cache(dt_min, dt_max, extra_days=extra_days)
-
-    for signal in signals:
-        day_trades = []
-        rejected = []
-
-        for direction in ["long", "short"]:
-            for symbol in signal.get(direction, []):
-                # start_time = time.time()
-                ohlc = ensure_market_data(symbol, signal["datetime"], params.indicator_config)
-                # print(f"Время {symbol} ohlc: {(time.time() - start_time):.4f} секунд")
-                if ohlc is None:
-                    rejected.append((symbol, "no_market_data"))
-                    continue
-
-                trade = simulate_trade(
-                    symbol=symbol,
-                    signal_time=signal["datetime"],
-                    params=params,
-                    ohlc=ohlc,
-                    direction=(LONG if direction == "long" else SHORT),
-                    market_cache=market_cache,
-                )
-                # print(f"Время {symbol} ohlc + trade: {(time.time() - start_time):.4f} секунд")
-                if trade.get("rejected"):
-                    rejected.append((symbol, trade["reject_reason"]))
-                else:
-                    trades.append(trade)
-                    day_trades.append(trade)
+    return build_market_cache(dt_min, dt_max, extra_days=extra_days)
+
+
+def _get_plan(signals, params, market_cache, entry_cache):
+    plan = entry_cache.get(params) if entry_cache is not None else None
+    if plan is None:
+        masks = entry_cache.masks if entry_cache is not None else None
+        plan = _plan_entries(signals, params, market_cache, masks)
+        if entry_cache is not None:
+            entry_cache.put(params, plan)
+    return plan
+
+
+def _valid_jobs(plan, exit_deadline_ts):
+    """
+    Плохие входы отклоняются до ядра, как раньше отказ simulate_trade по одной сделке.
+    Возвращает (jobs к симуляции, их дедлайны, причины по всем job, номер сделки в TradeLog или -1).
+    """
+    jobs = plan["jobs"]
+    # для сетки конфигов сделка валидна, если валидна при любом holding
+    deadline_min = exit_deadline_ts.min(axis=1) if exit_deadline_ts.ndim == 2 else exit_deadline_ts
+    reasons = validate_jobs(jobs, deadline_min, plan["blocks"])
+    ok = np.fromiter((r is None for r in reasons), dtype=bool, count=reasons.shape[0])
+    if not ok.all():
+        jobs = take_jobs(jobs, ok)
+        exit_deadline_ts = exit_deadline_ts[ok]
+    trade_pos = np.where(ok, np.cumsum(ok) - 1, -1)
+    return jobs, exit_deadline_ts, reasons, trade_pos
+
+
+def _signal_stats(signals, plan, trades, reasons, trade_pos) -> list[dict]:
+    signal_stats = []
+    symbols = plan["jobs"]["symbol"]
+    counts = signals.counts().tolist()
+    for i, (job_ids, rejected) in enumerate(plan["pending"]):
+        job_ids = np.asarray(job_ids, dtype=np.int64)
+        pos = trade_pos[job_ids]
+        bad = job_ids[pos < 0]
+        if bad.size:
+            # plan общий для трайлов — отказы этого прогона в отдельном списке
+            rejected = rejected + [(symbols[k], reasons[k]) for k in bad.tolist()]
+        day_pnl = trades.pnl[pos[pos >= 0]].tolist()
 
         signal_stats.append({
-            "datetime": signal["datetime"],
-            "symbols_total": len(signal["long"]) + len(signal.get("short", [])),
-            "symbols_traded": len(day_trades),
+            "datetime": signals.datetime[i],
+            "symbols_total": counts[i],
+            "symbols_traded": len(day_pnl),
             "symbols_rejected": len(rejected),
-            "total_pnl": sum(t["pnl"] for t in day_trades),
+            "total_pnl": sum(day_pnl),
             "avg_pnl": (
-                sum(t["pnl"] for t in day_trades) / len(day_trades)
-                if day_trades else 0
+                sum(day_pnl) / len(day_pnl)
+                if day_pnl else 0
             ),
         })
+    return signal_stats
+
+
+def backtest(signals, params, entry_cache=None):
+    """
+    signals: SignalTable (load_signals) либо прежний список dict {"datetime", "long", "short"}.
+    entry_cache: EntryCache на время study — входы/фильтры переиспользуются
+    трайлами с тем же delay_open и настройками индикаторов.
+    """
+    signals = as_signal_table(signals)
+    market_cache = _market_cache(signals, getattr(params, "holding_minutes", 0), getattr(params, "delay_open", 0))
+    plan = _get_plan(signals, params, market_cache, entry_cache)
 
-    print(f"Время: {(time.time() - start_time):.4f} секунд")
+    exit_deadline_ts = add_market_minutes_cached_many(plan["jobs"]["entry_ns"], int(params.holding_minutes), market_cache)
+    jobs, exit_deadline_ts, reasons, trade_pos = _valid_jobs(plan, exit_deadline_ts)
+
+    # jobs идут в порядке сигналов — TradeLog уже в нужном порядке
+    trades = simulate_batch(jobs, exit_deadline_ts, plan["blocks"], params)
+    signal_stats = _signal_stats(signals, plan, trades, reasons, trade_pos)
     return trades, signal_stats
+
+
+def backtest_grid(signals, params_list, entry_cache=None):
+    """
+    Несколько конфигов выхода с общими входами за один проход по барам каждой сделки.
+    Все params_list должны совпадать по EntryCache.key (delay_open, индикаторы) и издержкам —
+    различаются только sl/tp/holding/PSAR/TS. Возвращает [(TradeLog, signal_stats)] по конфигам.
+    """
+    params = params_list[0]
+    key = EntryCache.key(params)
+    if any(EntryCache.key(p) != key for p in params_list):
+        raise ValueError("backtest_grid: params_list с разными входами (delay_open/индикаторы)")
+
+    signals = as_signal_table(signals)
+    max_holding = max(int(p.holding_minutes) for p in params_list)
+    market_cache = _market_cache(signals, max_holding, getattr(params, "delay_open", 0))
+    plan = _get_plan(signals, params, market_cache, entry_cache)
+
+    entry_ns = plan["jobs"]["entry_ns"]
+    by_holding = {}
+    deadlines = np.empty((entry_ns.shape[0], len(params_list)), dtype=np.int64)
+    for j, p in enumerate(params_list):
+        minutes = int(p.holding_minutes)
+        if minutes not in by_holding:
+            by_holding[minutes] = add_market_minutes_cached_many(entry_ns, minutes, market_cache)
+        deadlines[:, j] = by_holding[minutes]
+
+    jobs, deadlines, reasons, trade_pos = _valid_jobs(plan, deadlines)
+    logs = simulate_batch_grid(jobs, deadlines, plan["blocks"], params_list, params)
+    results = [(trades, _signal_stats(signals, plan, trades, reasons, trade_pos)) for trades in logs]
+    return results
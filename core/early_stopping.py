@@ -6,8 +6,13 @@ class EarlyStopper:
         self.counter = 0
 
     def __call__(self, study, trial):
+        if self.update(study):
+            study.stop()
+
+    def update(self, study) -> bool:
+        """Учитывает завершённый трайл; True — пора останавливаться (для цикла ask/tell)."""
         if len(study.trials) < self.warmup:
-            return
+            return False
 
         # берем первую цель (return)
         current_best = max(
@@ -21,5 +26,4 @@ class EarlyStopper:
         else:
             self.counter += 1
 
-        if self.counter >= self.patience:
-            study.stop()
+        return self.counter >= self.patience
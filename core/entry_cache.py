@@ -0,0 +1,35 @@
+from core.filters import filter_key
+
+
+class EntryCache:
+    """
+    Кэш входов на время одного study (один и тот же набор сигналов).
+    Время/индекс входа и результат фильтров зависят только от
+    (сигнал, символ, delay_open, настройки индикаторов), но не от sl/tp/holding —
+    трайлы с тем же ключом пропускают подготовку и сразу идут в ядро выхода.
+    """
+
+    def __init__(self):
+        self._plans = {}
+        # (symbol, filter_key) -> (dt_ns баров, маска): маски общие для всех delay_open
+        self.masks = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(params) -> tuple:
+        return int(params.delay_open), filter_key(params.indicator_config)
+
+    def get(self, params):
+        plan = self._plans.get(self.key(params))
+        if plan is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return plan
+
+    def put(self, params, plan):
+        self._plans[self.key(params)] = plan
+
+    def __len__(self) -> int:
+        return len(self._plans)
@@ -1,5 +1,15 @@
+import numpy as np
 import pandas as pd
 
+def filter_key(indicator_config) -> tuple:
+    """Хэшируемый ключ включённых фильтров (одинаковый у трайлов с одинаковыми EMA/RSI)."""
+    key = []
+    for name in sorted(indicator_config):
+        cfg = indicator_config[name]
+        if cfg and cfg[0]:
+            key.append((name,) + tuple(cfg[1:]))
+    return tuple(key)
+
 def filters(row, params) -> bool:
     ema_cfg = params.indicator_config.get("ema")
     if ema_cfg and ema_cfg[0]:
@@ -42,3 +52,75 @@ def filters(row, params) -> bool:
     #         return False
 
     return True
+
+# =====================
+# Векторные маски: predicate(frame, n) -> bool-массив по всем барам символа;
+# frame — DataFrame либо dict {колонка: массив} (колонки индикаторов к mmap-барам)
+# =====================
+
+def _ema_mask(frame, cfg, n) -> np.ndarray:
+    _, sign, fast, slow = cfg
+    col_fast = f"ema_{int(fast)}"
+    col_slow = f"ema_{int(slow)}"
+
+    if col_fast not in frame or col_slow not in frame:
+        return np.zeros(n, dtype=bool)
+
+    fast_v = np.asarray(frame[col_fast], dtype=np.float64)
+    slow_v = np.asarray(frame[col_slow], dtype=np.float64)
+    mask = ~(np.isnan(fast_v) | np.isnan(slow_v))
+
+    # above => fast > slow ; below => fast < slow
+    if sign == "above":
+        mask &= fast_v > slow_v
+    elif sign == "below":
+        mask &= fast_v < slow_v
+    return mask
+
+def _rsi_mask(frame, cfg, n) -> np.ndarray:
+    _, sign, level, period = cfg
+    col = f"rsi_{period}"
+
+    if col not in frame:
+        return np.zeros(n, dtype=bool)
+
+    v = np.asarray(frame[col], dtype=np.float64)
+    mask = ~np.isnan(v)
+
+    if sign == "above":
+        mask &= v > level
+    elif sign == "below":
+        mask &= v < level
+    return mask
+
+# def _volume_mask(frame, cfg, n) -> np.ndarray:
+#     v = frame["volume"].to_numpy(dtype=np.float64)
+#     ma = frame["volume_ma"].to_numpy(dtype=np.float64)
+#     return ~(v <= ma)
+
+FILTER_MASKS = {
+    "ema": _ema_mask,
+    "rsi": _rsi_mask,
+    # "volume": _volume_mask,
+}
+
+def compile_filters(indicator_config):
+    """
+    Собирает включённые фильтры indicator_config в один векторный предикат.
+    predicate(frame, n=None) -> bool-массив длины n (по умолчанию len(frame) — для DataFrame);
+    mask[i] == filters(frame.iloc[i], params).
+    """
+    parts = [
+        (FILTER_MASKS[name], cfg)
+        for name, cfg in indicator_config.items()
+        if cfg and cfg[0] and name in FILTER_MASKS
+    ]
+
+    def predicate(frame, n=None) -> np.ndarray:
+        n = len(frame) if n is None else int(n)
+        mask = np.ones(n, dtype=bool)
+        for fn, cfg in parts:
+            mask &= fn(frame, cfg, n)
+        return mask
+
+    return predicate
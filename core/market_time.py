@@ -1,13 +1,19 @@
 from datetime import datetime, time, timedelta
+from functools import lru_cache
 import pandas as pd
 import pytz
 import numpy as np
-import exchange_calendars as xcals
 
-XNYS = xcals.get_calendar("XNYS")
 UTC = pytz.UTC
 
 
+@lru_cache(maxsize=1)
+def _xnys():
+    # exchange_calendars тяжёлый (импорт + сборка календаря) — только при первом обращении
+    import exchange_calendars as xcals
+    return xcals.get_calendar("XNYS")
+
+
 def _to_utc_ts(dt: datetime) -> pd.Timestamp:
     ts = pd.Timestamp(dt)
     if ts.tzinfo is None:
@@ -27,7 +33,7 @@ def build_market_cache(dt_min, dt_max, extra_days=30):
     t1 = _to_utc_ts(dt_max).normalize() + pd.Timedelta(days=int(extra_days))
 
     # schedule DataFrame на диапазон
-    sched = XNYS.schedule.loc[t0.date():t1.date()]
+    sched = _xnys().schedule.loc[t0.date():t1.date()]
 
     # в exchange_calendars встречаются разные имена колонок
     if "open" in sched.columns and "close" in sched.columns:
@@ -104,6 +110,74 @@ def add_market_minutes_cached(t_ns: int, minutes: int, cache) -> int:
     return int(opens_ns[j] + offset * 60_000_000_000)
 
 
+def last_closed_bar_cached(t_ns: int, bar_minutes: int, cache) -> int:
+    """
+    Начало последнего бара bar_minutes, закрытого к моменту t_ns (UTC ns), по готовому cache:
+    бары отсчитываются от открытия сессии, вне сессии — последний бар предыдущей.
+    Если в cache нет сессий до t_ns — возвращает t_ns.
+    """
+    opens_ns = cache["opens_ns"]
+    closes_ns = cache["closes_ns"]
+    bar_ns = int(bar_minutes) * 60_000_000_000
+
+    # последняя сессия, открывшаяся не позже t
+    i = int(np.searchsorted(opens_ns, t_ns, side="right")) - 1
+    while i >= 0:
+        closed = (min(int(t_ns), int(closes_ns[i])) - int(opens_ns[i])) // bar_ns
+        if closed > 0:
+            return int(opens_ns[i] + (closed - 1) * bar_ns)
+        i -= 1
+    return int(t_ns)
+
+
+def add_market_minutes_cached_many(t_ns, minutes: int, cache) -> np.ndarray:
+    """
+    Векторная версия add_market_minutes_cached: один и тот же сдвиг minutes
+    для массива моментов t_ns (UTC ns). Результат совпадает поэлементно.
+    """
+    t = np.asarray(t_ns, dtype=np.int64)
+    out = t.copy()
+    remaining = int(minutes)
+    if remaining <= 0 or t.size == 0:
+        return out
+
+    ns_min = 60_000_000_000
+    opens_ns = cache["opens_ns"]
+    closes_ns = cache["closes_ns"]
+    cum = cache["cum_minutes"]
+    n = closes_ns.size
+    if n == 0:
+        return out
+
+    # первая сессия, у которой close > t
+    i = np.searchsorted(closes_ns, t, side="right")
+    valid = i < n
+    ic = np.minimum(i, n - 1)
+
+    seg_start = np.maximum(t, opens_ns[ic])
+    avail = np.maximum((closes_ns[ic] - seg_start) // ns_min, 0)
+
+    inside = valid & (remaining <= avail)
+    out[inside] = seg_start[inside] + remaining * ns_min
+
+    rest = valid & ~inside
+    target = cum[ic + 1] + (remaining - avail)
+    j = np.searchsorted(cum, target, side="right") - 1
+
+    beyond = rest & (j >= n)
+    out[beyond] = closes_ns[-1]
+
+    jc = np.clip(j, 0, n - 1)
+    offset = target - cum[jc]
+
+    at_close = rest & ~beyond & (offset == 0) & (j > 0)
+    out[at_close] = closes_ns[np.maximum(jc - 1, 0)][at_close]
+
+    normal = rest & ~beyond & ~at_close
+    out[normal] = opens_ns[jc][normal] + offset[normal] * ns_min
+    return out
+
+
 def compute_entry_time_cached(signal_dt: datetime, delay_minutes: int, cache) -> datetime:
     """
     Быстрый entry_dt по cache:
@@ -160,7 +234,7 @@ def add_market_minutes(entry_ts_utc: pd.Timestamp, minutes: int) -> pd.Timestamp
         horizon_days = max(360, int(remaining / 300) + 30)
         start = t.normalize() - pd.Timedelta(days=10)
         end = t.normalize() + pd.Timedelta(days=horizon_days)
-        sched = XNYS.schedule.loc[start.date():end.date()]
+        sched = _xnys().schedule.loc[start.date():end.date()]
 
         advanced = False
         for _, row in sched.iterrows():
@@ -196,22 +270,23 @@ def add_market_minutes(entry_ts_utc: pd.Timestamp, minutes: int) -> pd.Timestamp
 
 def compute_entry_time(signal_dt: datetime, delay_minutes: int) -> datetime:
     # старый вариант по XNYS (медленнее) оставляем
+    xnys = _xnys()
     signal_utc = _to_utc_ts(signal_dt)
     day = signal_utc.normalize()
 
-    if not XNYS.is_session(day.date()):
-        next_sess = XNYS.next_session(day.date())
-        open_utc = XNYS.session_open(next_sess).tz_convert("UTC")
-        close_utc = XNYS.session_close(next_sess).tz_convert("UTC")
+    if not xnys.is_session(day.date()):
+        next_sess = xnys.next_session(day.date())
+        open_utc = xnys.session_open(next_sess).tz_convert("UTC")
+        close_utc = xnys.session_close(next_sess).tz_convert("UTC")
     else:
-        open_utc = XNYS.session_open(day.date()).tz_convert("UTC")
-        close_utc = XNYS.session_close(day.date()).tz_convert("UTC")
+        open_utc = xnys.session_open(day.date()).tz_convert("UTC")
+        close_utc = xnys.session_close(day.date()).tz_convert("UTC")
 
     if signal_utc < open_utc:
         base = open_utc
     elif signal_utc >= close_utc:
-        next_sess = XNYS.next_session(open_utc.date())
-        base = XNYS.session_open(next_sess).tz_convert("UTC")
+        next_sess = xnys.next_session(open_utc.date())
+        base = xnys.session_open(next_sess).tz_convert("UTC")
     else:
         base = signal_utc
 
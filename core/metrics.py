@@ -4,6 +4,8 @@ import math
 import numpy as np
 import pandas as pd
 
+from core.trade_log import TradeLog
+
 
 # ---------------------------
 # Helpers
@@ -143,6 +145,68 @@ def _compute_avg_hold_minutes(df: pd.DataFrame) -> float:
     return 0.0
 
 
+def _trade_log_inputs(log: TradeLog):
+    """pnl / returns / avg_hold_minutes напрямую из колонок TradeLog (без DataFrame)."""
+    if len(log) == 0:
+        return None
+
+    # тот же порядок, что DataFrame.sort_values("exit_dt")
+    order = np.argsort(log.exit_ns, kind="quicksort")
+
+    pnl = log.pnl[order]
+    pnl = pnl[np.isfinite(pnl)]
+    if pnl.size == 0:
+        return None
+
+    rets = log.return_pct[order]
+    rets = rets[np.isfinite(rets)] / 100.0
+    if rets.size != pnl.size:
+        rets = pnl.copy()
+
+    hold = log.hold_minutes[np.isfinite(log.hold_minutes)]
+    hold = hold[hold >= 0]
+    avg_hold_minutes = float(hold.mean()) if hold.size else 0.0
+
+    return pnl, rets, avg_hold_minutes
+
+
+def _records_inputs(trades: list[dict]):
+    df = pd.DataFrame(trades)
+    if df.empty:
+        return None
+
+    # фильтр rejected (если есть)
+    if "rejected" in df.columns:
+        df = df[df["rejected"] == False]  # noqa: E712
+    if df.empty:
+        return None
+
+    # сортировка по времени для корректной equity/стабильности
+    sort_col = None
+    for col in ("exit_dt", "entry_dt"):
+        if col in df.columns:
+            sort_col = col
+            break
+    if sort_col:
+        df = df.sort_values(sort_col)
+
+    pnl = pd.to_numeric(df.get("pnl"), errors="coerce")
+    pnl = pnl.replace([np.inf, -np.inf], np.nan).dropna().to_numpy(dtype=float)
+    if pnl.size == 0:
+        return None
+
+    # Доходности: prefer return_pct, иначе pnl как прокси (не идеально, но лучше чем ничего)
+    if "return_pct" in df.columns:
+        rets = pd.to_numeric(df["return_pct"], errors="coerce")
+        rets = rets.replace([np.inf, -np.inf], np.nan).dropna().to_numpy(dtype=float) / 100.0
+        if rets.size != pnl.size:
+            rets = pnl.copy()
+    else:
+        rets = pnl.copy()
+
+    return pnl, rets, _compute_avg_hold_minutes(df)
+
+
 # ---------------------------
 # Variant A Objective
 # ---------------------------
@@ -226,7 +290,7 @@ def objective_variant_a(
 ObjectiveName = Literal["legacy", "variant_a"]
 
 def compute_metrics(
-    trades: list[dict],
+    trades: list[dict] | TradeLog,
     params: Optional[Any] = None,
     *,
     objective: ObjectiveName = "variant_a",
@@ -236,43 +300,20 @@ def compute_metrics(
 ) -> Dict[str, float]:
     """
     Возвращает summary-метрики + score.
+    trades: TradeLog из backtest или список trade-dict.
     delay_penalty_k: мягко предпочесть delay_open=0, но не запрещать.
     """
-    df = pd.DataFrame(trades)
-    if df.empty:
-        return {}
-
-    # фильтр rejected (если есть)
-    if "rejected" in df.columns:
-        df = df[df["rejected"] == False]  # noqa: E712
-    if df.empty:
+    if isinstance(trades, TradeLog):
+        inputs = _trade_log_inputs(trades)
+    else:
+        inputs = _records_inputs(trades)
+    if inputs is None:
         return {}
 
-    # сортировка по времени для корректной equity/стабильности
-    sort_col = None
-    for col in ("exit_dt", "entry_dt"):
-        if col in df.columns:
-            sort_col = col
-            break
-    if sort_col:
-        df = df.sort_values(sort_col)
-
-    pnl = pd.to_numeric(df.get("pnl"), errors="coerce")
-    pnl = pnl.replace([np.inf, -np.inf], np.nan).dropna().to_numpy(dtype=float)
+    pnl, rets, avg_hold_minutes = inputs
     n = int(pnl.size)
-    if n == 0:
-        return {}
-    
-    total_pnl = float(pnl.sum())
 
-    # Доходности: prefer return_pct, иначе pnl как прокси (не идеально, но лучше чем ничего)
-    if "return_pct" in df.columns:
-        rets = pd.to_numeric(df["return_pct"], errors="coerce")
-        rets = rets.replace([np.inf, -np.inf], np.nan).dropna().to_numpy(dtype=float) / 100.0
-        if rets.size != pnl.size:
-            rets = pnl.copy()
-    else:
-        rets = pnl.copy()
+    total_pnl = float(pnl.sum())
 
     wins = pnl[pnl > 0]
     losses = pnl[pnl < 0]
@@ -314,8 +355,6 @@ def compute_metrics(
     comp_pen = complexity_penalty(params)
     samp_pen = sample_penalty(n)
 
-    avg_hold_minutes = _compute_avg_hold_minutes(df)
-
     # Собираем summary
     summary: Dict[str, float] = {
         "trades": float(n),
@@ -5,23 +5,25 @@ import numpy as np
 from core.market_time import compute_entry_time, add_market_minutes
 from core.market_time import compute_entry_time_cached, add_market_minutes_cached
 from core.filters import filters
+from core.trade_log import TradeLog, EXIT_REASON
 
 # =====================
 # Constants / Enums
 # =====================
 
-EXIT_REASON = {0: "sl", 1: "tp", 2: "time_exit", 3: "psar", 4: "ts"}
-
 LONG = 1
 SHORT = -1
 
-@nb.njit
+# баров в блоке для сводок high/low (first-touch поиск выхода)
+TOUCH_BLOCK = 32
+
+@nb.njit(cache=True)
 def _check_time_exit(ts, exit_deadline, o):
     if ts >= exit_deadline:
         return True, o, 2
     return False, 0.0, -1
 
-@nb.njit
+@nb.njit(cache=True)
 def _check_sl_tp(direction, bullish, o, h, l, sl_price, tp_price):
     # returns: hit, exit_price, reason
     if direction == LONG:
@@ -54,7 +56,7 @@ def _check_sl_tp(direction, bullish, o, h, l, sl_price, tp_price):
 
     return False, 0.0, -1
 
-@nb.njit
+@nb.njit(cache=True)
 def _ts_init(direction, entry_price, ts_dist):
     # returns initial trailing stop level + best extreme
     if direction == LONG:
@@ -65,7 +67,7 @@ def _ts_init(direction, entry_price, ts_dist):
         trail = entry_price * (1.0 + ts_dist / 100.0)
     return trail, best
 
-@nb.njit
+@nb.njit(cache=True)
 def _ts_update_and_check(direction, o, h, l, ts_dist, trail, best):
     if direction == LONG:
         if h > best:
@@ -88,7 +90,7 @@ def _ts_update_and_check(direction, o, h, l, ts_dist, trail, best):
             return True, best, trail, max(trail, o), 4
         return False, best, trail, 0.0, -1
     
-@nb.njit
+@nb.njit(cache=True)
 def _psar_init(direction, entry_high, entry_low, psar_step):
     psar = 0.0
     ep = 0.0
@@ -107,7 +109,7 @@ def _psar_init(direction, entry_high, entry_low, psar_step):
     return psar, ep, af, bull
 
 
-@nb.njit
+@nb.njit(cache=True)
 def _psar_update_and_check(
     direction,
     o, h, l,
@@ -157,11 +159,12 @@ def _psar_update_and_check(
 
     return False, psar, ep, af, bull, 0.0, -1
 
-@nb.njit
-def simulate_trade_core(
+@nb.njit(cache=True)
+def _simulate_range(
     dt_ns,
     ohlc,
     entry_idx,
+    end_idx,
     exit_deadline_ts,
     direction,
     sl_pct,
@@ -211,7 +214,7 @@ def simulate_trade_core(
         trail, best = _ts_init(direction, entry_price, ts_dist)
 
     had_exit = False
-    for i in range(entry_idx + 1, ohlc.shape[0]):
+    for i in range(entry_idx + 1, end_idx):
         ts = dt_ns[i]
         o  = ohlc[i, 0]
         h  = ohlc[i, 1]
@@ -270,7 +273,7 @@ def simulate_trade_core(
         prev_high1 = h
 
     if not had_exit:
-        exit_idx = ohlc.shape[0] - 1
+        exit_idx = end_idx - 1
         exit_price = ohlc[exit_idx, 3]
         reason = 2
 
@@ -282,44 +285,945 @@ def simulate_trade_core(
 
     return pnl, entry_price, exit_price, exit_idx, reason
 
-def simulate_trade(symbol, signal_time, params, ohlc, direction=LONG, market_cache=None):
+@nb.njit(cache=True)
+def build_touch_tables(ohlc):
+    """
+    Sparse-таблицы max(high)/min(low) по блокам из TOUCH_BLOCK баров.
+    hi[j, b] — max high на блоках [b, b + 2^j) (у правого края — усечённо).
+    """
+    n = ohlc.shape[0]
+    n_blocks = (n + TOUCH_BLOCK - 1) // TOUCH_BLOCK
+    levels = 1
+    while (1 << levels) <= n_blocks:
+        levels += 1
+
+    hi = np.empty((levels, max(n_blocks, 1)), dtype=np.float64)
+    lo = np.empty((levels, max(n_blocks, 1)), dtype=np.float64)
+
+    for b in range(n_blocks):
+        mx = -np.inf
+        mn = np.inf
+        for i in range(b * TOUCH_BLOCK, min(n, (b + 1) * TOUCH_BLOCK)):
+            if ohlc[i, 1] > mx:
+                mx = ohlc[i, 1]
+            if ohlc[i, 2] < mn:
+                mn = ohlc[i, 2]
+        hi[0, b] = mx
+        lo[0, b] = mn
+
+    for j in range(1, levels):
+        half = 1 << (j - 1)
+        for b in range(n_blocks):
+            if b + half < n_blocks:
+                hi[j, b] = max(hi[j - 1, b], hi[j - 1, b + half])
+                lo[j, b] = min(lo[j - 1, b], lo[j - 1, b + half])
+            else:
+                hi[j, b] = hi[j - 1, b]
+                lo[j, b] = lo[j - 1, b]
+
+    return hi, lo
+
+@nb.njit(cache=True)
+def _skip_quiet_blocks(hi_table, lo_table, i, stop, up_level, down_level):
+    """
+    С выровненного по блоку бара i пропускает целые блоки до stop, где
+    max(high) < up_level и min(low) > down_level. Возвращает новый бар.
+    """
+    b = i // TOUCH_BLOCK
+    b_stop = stop // TOUCH_BLOCK
+    for j in range(hi_table.shape[0] - 1, -1, -1):
+        w = 1 << j
+        if b + w <= b_stop and hi_table[j, b] < up_level and lo_table[j, b] > down_level:
+            b += w
+    return max(i, b * TOUCH_BLOCK)
+
+@nb.njit(cache=True)
+def _first_touch(ohlc, hi_table, lo_table, start, stop, up_level, down_level):
+    """Первый бар в [start, stop) с high >= up_level или low <= down_level; stop, если нет."""
+    i = start
+    # хвост до границы блока
+    while i < stop and i % TOUCH_BLOCK != 0:
+        if ohlc[i, 1] >= up_level or ohlc[i, 2] <= down_level:
+            return i
+        i += 1
+
+    # целые блоки без касания пропускаем двоичными шагами
+    i = _skip_quiet_blocks(hi_table, lo_table, i, stop, up_level, down_level)
+    while i < stop:
+        if ohlc[i, 1] >= up_level or ohlc[i, 2] <= down_level:
+            return i
+        i += 1
+    return stop
+
+@nb.njit(cache=True)
+def _simulate_range_touch(
+    dt_ns,
+    ohlc,
+    hi_table,
+    lo_table,
+    entry_idx,
+    end_idx,
+    exit_deadline_ts,
+    direction,
+    sl_pct,
+    tp_pct,
+    slippage,
+    commission
+):
+    """
+    Только SL/TP/time exit (без PSAR и TS): выход = первое касание уровня до дедлайна.
+    Результат совпадает с _simulate_range при psar_enabled=ts_enabled=False.
+    """
+    entry_price = ohlc[entry_idx, 0] * (1.0 + slippage * direction)
+
+    if direction == LONG:
+        sl_price = entry_price * (1.0 - sl_pct / 100.0)
+        tp_price = entry_price * (1.0 + tp_pct / 100.0)
+        up_level = tp_price
+        down_level = sl_price
+    else:
+        sl_price = entry_price * (1.0 + sl_pct / 100.0)
+        tp_price = entry_price * (1.0 - tp_pct / 100.0)
+        up_level = sl_price
+        down_level = tp_price
+
+    start = entry_idx + 1
+    if start > end_idx:
+        start = end_idx
+
+    # бар time exit: первый с ts >= дедлайна (проверяется раньше SL/TP)
+    deadline_idx = start + np.searchsorted(dt_ns[start:end_idx], exit_deadline_ts)
+
+    i = _first_touch(ohlc, hi_table, lo_table, start, deadline_idx, up_level, down_level)
+    if i < deadline_idx:
+        bullish = ohlc[i, 3] >= ohlc[i, 0]
+        hit, exit_price, reason = _check_sl_tp(
+            direction, bullish, ohlc[i, 0], ohlc[i, 1], ohlc[i, 2], sl_price, tp_price
+        )
+        exit_idx = i
+    elif deadline_idx < end_idx:
+        exit_idx = deadline_idx
+        exit_price = ohlc[exit_idx, 0]
+        reason = 2
+    else:
+        exit_idx = end_idx - 1
+        exit_price = ohlc[exit_idx, 3]
+        reason = 2
+
+    # ---------- APPLY SLIPPAGE + COMMISSION ----------
+    exit_price = exit_price * (1.0 - slippage * direction)
+
+    pnl = (exit_price - entry_price) * direction
+    pnl -= commission * 2
+
+    return pnl, entry_price, exit_price, exit_idx, reason
+
+@nb.njit(cache=True)
+def _simulate_range_ts(
+    dt_ns,
+    ohlc,
+    hi_table,
+    lo_table,
+    entry_idx,
+    end_idx,
+    exit_deadline_ts,
+    direction,
+    sl_pct,
+    tp_pct,
+    ts_dist,
+    slippage,
+    commission
+):
+    """
+    Trailing stop + SL/TP/time exit (без PSAR) с пропуском «тихих» блоков:
+    блок пропускается, если на нём не может сработать ни SL/TP, ни TS и не
+    обновляется экстремум (тогда состояние трейла не меняется).
+    Результат совпадает с _simulate_range при psar_enabled=False, ts_enabled=True.
+    """
+    entry_price = ohlc[entry_idx, 0] * (1.0 + slippage * direction)
+
+    if direction == LONG:
+        sl_price = entry_price * (1.0 - sl_pct / 100.0)
+        tp_price = entry_price * (1.0 + tp_pct / 100.0)
+    else:
+        sl_price = entry_price * (1.0 + sl_pct / 100.0)
+        tp_price = entry_price * (1.0 - tp_pct / 100.0)
+
+    trail, best = _ts_init(direction, entry_price, ts_dist)
+
+    start = entry_idx + 1
+    if start > end_idx:
+        start = end_idx
+    # блоки пропускаем только строго до бара time exit
+    deadline_idx = start + np.searchsorted(dt_ns[start:end_idx], exit_deadline_ts)
+
+    exit_price = entry_price
+    exit_idx = entry_idx
+    reason = 2
+
+    had_exit = False
+    i = start
+    while i < end_idx:
+        if i % TOUCH_BLOCK == 0 and i < deadline_idx:
+            if direction == LONG:
+                up_level = min(tp_price, best)
+                down_level = max(sl_price, trail)
+            else:
+                up_level = min(sl_price, trail)
+                down_level = max(tp_price, best)
+            nxt = _skip_quiet_blocks(hi_table, lo_table, i, deadline_idx, up_level, down_level)
+            if nxt > i:
+                i = nxt
+                continue
+
+        ts = dt_ns[i]
+        o  = ohlc[i, 0]
+        h  = ohlc[i, 1]
+        l  = ohlc[i, 2]
+        c  = ohlc[i, 3]
+
+        # ---------- TIME EXIT ----------
+        hit, px, rsn = _check_time_exit(ts, exit_deadline_ts, o)
+        if hit:
+            exit_price = px
+            exit_idx = i
+            reason = rsn
+            had_exit = True
+            break
+
+        # ---------- Trailing Stop ----------
+        hit, best, trail, px, rsn = _ts_update_and_check(direction, o, h, l, ts_dist, trail, best)
+        if hit:
+            exit_price = px
+            exit_idx = i
+            reason = rsn
+            had_exit = True
+            break
+
+        # ---------- SL/TP candle model ----------
+        bullish = c >= o
+        hit, px, rsn = _check_sl_tp(direction, bullish, o, h, l, sl_price, tp_price)
+        if hit:
+            exit_price = px
+            exit_idx = i
+            reason = rsn
+            had_exit = True
+            break
+
+        i += 1
+
+    if not had_exit:
+        exit_idx = end_idx - 1
+        exit_price = ohlc[exit_idx, 3]
+        reason = 2
+
+    # ---------- APPLY SLIPPAGE + COMMISSION ----------
+    exit_price = exit_price * (1.0 - slippage * direction)
+
+    pnl = (exit_price - entry_price) * direction
+    pnl -= commission * 2
+
+    return pnl, entry_price, exit_price, exit_idx, reason
+
+@nb.njit(cache=True)
+def _simulate_one(
+    dt_ns,
+    ohlc,
+    hi_table,
+    lo_table,
+    entry_idx,
+    end_idx,
+    exit_deadline_ts,
+    direction,
+    sl_pct,
+    tp_pct,
+    psar_enabled,
+    psar_step,
+    psar_max,
+    ts_enabled,
+    ts_dist,
+    slippage,
+    commission
+):
+    if not psar_enabled and not ts_enabled:
+        return _simulate_range_touch(
+            dt_ns, ohlc, hi_table, lo_table, entry_idx, end_idx, exit_deadline_ts, direction,
+            sl_pct, tp_pct, slippage, commission
+        )
+    if not psar_enabled:
+        return _simulate_range_ts(
+            dt_ns, ohlc, hi_table, lo_table, entry_idx, end_idx, exit_deadline_ts, direction,
+            sl_pct, tp_pct, ts_dist, slippage, commission
+        )
+    # PSAR сдвигается на каждом баре (и зажимается предыдущими low/high) —
+    # пропускать блоки нельзя, только побаровый цикл
+    return _simulate_range(
+        dt_ns, ohlc, entry_idx, end_idx, exit_deadline_ts, direction,
+        sl_pct, tp_pct,
+        psar_enabled, psar_step, psar_max,
+        ts_enabled, ts_dist,
+        slippage, commission
+    )
+
+@nb.njit(cache=True)
+def simulate_trade_core(
+    dt_ns,
+    ohlc,
+    entry_idx,
+    exit_deadline_ts,
+    direction,
+    sl_pct,
+    tp_pct,
+    psar_enabled,
+    psar_step,
+    psar_max,
+    ts_enabled,
+    ts_dist,
+    slippage,
+    commission
+):
+    return _simulate_range(
+        dt_ns, ohlc, entry_idx, ohlc.shape[0], exit_deadline_ts, direction,
+        sl_pct, tp_pct,
+        psar_enabled, psar_step, psar_max,
+        ts_enabled, ts_dist,
+        slippage, commission
+    )
+
+@nb.njit(cache=True)
+def _batch_job(
+    dt_blocks, ohlc_blocks, hi_blocks, lo_blocks, block, entry_idx, exit_deadline_ts, direction,
+    sl_pct, tp_pct, psar_enabled, psar_step, psar_max, ts_enabled, ts_dist,
+    slippage, commission, k, pnl, entry_price, exit_price, exit_idx, exit_ns, reason
+):
+    b = block[k]
+    dt_ns = dt_blocks[b]
+    p, en, ex, xi, rsn = _simulate_one(
+        dt_ns, ohlc_blocks[b], hi_blocks[b], lo_blocks[b], entry_idx[k], dt_ns.shape[0],
+        exit_deadline_ts[k], direction[k],
+        sl_pct, tp_pct,
+        psar_enabled, psar_step, psar_max,
+        ts_enabled, ts_dist,
+        slippage, commission
+    )
+    pnl[k] = p
+    entry_price[k] = en
+    exit_price[k] = ex
+    exit_idx[k] = xi
+    exit_ns[k] = dt_ns[xi]
+    reason[k] = rsn
+
+@nb.njit(cache=True)
+def simulate_trades_batch(
+    dt_blocks,
+    ohlc_blocks,
+    hi_blocks,
+    lo_blocks,
+    block,
+    entry_idx,
+    exit_deadline_ts,
+    direction,
+    sl_pct,
+    tp_pct,
+    psar_enabled,
+    psar_step,
+    psar_max,
+    ts_enabled,
+    ts_dist,
+    slippage,
+    commission
+):
+    """
+    Все сделки бэктеста за один вызов.
+    dt_blocks/ohlc_blocks — typed List баров символов как есть (в т.ч. mmap, без склейки и копий),
+    hi_blocks/lo_blocks — build_touch_tables каждого блока; бары сделки k — блок block[k].
+    entry_idx и возвращаемый exit_idx — внутри блока.
+    Возвращает колонки: pnl, entry_price, exit_price, exit_idx, exit_ns, reason.
+    """
+    n = entry_idx.shape[0]
+    pnl = np.empty(n, dtype=np.float64)
+    entry_price = np.empty(n, dtype=np.float64)
+    exit_price = np.empty(n, dtype=np.float64)
+    exit_idx = np.empty(n, dtype=np.int64)
+    exit_ns = np.empty(n, dtype=np.int64)
+    reason = np.empty(n, dtype=np.int64)
+
+    for k in range(n):
+        _batch_job(
+            dt_blocks, ohlc_blocks, hi_blocks, lo_blocks, block, entry_idx, exit_deadline_ts, direction,
+            sl_pct, tp_pct, psar_enabled, psar_step, psar_max, ts_enabled, ts_dist,
+            slippage, commission, k, pnl, entry_price, exit_price, exit_idx, exit_ns, reason
+        )
+
+    return pnl, entry_price, exit_price, exit_idx, exit_ns, reason
+
+@nb.njit(parallel=True, cache=True)
+def simulate_trades_batch_parallel(
+    dt_blocks,
+    ohlc_blocks,
+    hi_blocks,
+    lo_blocks,
+    block,
+    entry_idx,
+    exit_deadline_ts,
+    direction,
+    sl_pct,
+    tp_pct,
+    psar_enabled,
+    psar_step,
+    psar_max,
+    ts_enabled,
+    ts_dist,
+    slippage,
+    commission
+):
+    """То же, что simulate_trades_batch, но сделки распределяются по потокам numba (prange)."""
+    n = entry_idx.shape[0]
+    pnl = np.empty(n, dtype=np.float64)
+    entry_price = np.empty(n, dtype=np.float64)
+    exit_price = np.empty(n, dtype=np.float64)
+    exit_idx = np.empty(n, dtype=np.int64)
+    exit_ns = np.empty(n, dtype=np.int64)
+    reason = np.empty(n, dtype=np.int64)
+
+    for k in nb.prange(n):
+        _batch_job(
+            dt_blocks, ohlc_blocks, hi_blocks, lo_blocks, block, entry_idx, exit_deadline_ts, direction,
+            sl_pct, tp_pct, psar_enabled, psar_step, psar_max, ts_enabled, ts_dist,
+            slippage, commission, k, pnl, entry_price, exit_price, exit_idx, exit_ns, reason
+        )
+
+    return pnl, entry_price, exit_price, exit_idx, exit_ns, reason
+
+@nb.njit(cache=True)
+def simulate_trade_grid(
+    dt_ns,
+    ohlc,
+    entry_idx,
+    end_idx,
+    exit_deadline_ts,
+    direction,
+    sl_pct,
+    tp_pct,
+    psar_enabled,
+    psar_step,
+    psar_max,
+    ts_enabled,
+    ts_dist,
+    slippage,
+    commission
+):
+    """
+    Одна сделка (общий вход и путь цены) × m конфигов выхода за один проход по барам.
+    exit_deadline_ts, sl_pct ... ts_dist — векторы длины m (по конфигу).
+    Возвращает (m, 5): pnl, entry_price, exit_price, exit_idx, reason.
+    """
+    m = sl_pct.shape[0]
+
+    entry_high = ohlc[entry_idx, 1]
+    entry_low  = ohlc[entry_idx, 2]
+
+    entry_price = ohlc[entry_idx, 0] * (1.0 + slippage * direction)
+
+    sl_price = np.empty(m, dtype=np.float64)
+    tp_price = np.empty(m, dtype=np.float64)
+
+    psar = np.zeros(m, dtype=np.float64)
+    ep = np.zeros(m, dtype=np.float64)
+    af = np.empty(m, dtype=np.float64)
+    bull = np.ones(m, dtype=np.bool_)
+
+    trail = np.zeros(m, dtype=np.float64)
+    best = np.zeros(m, dtype=np.float64)
+
+    exit_price = np.empty(m, dtype=np.float64)
+    exit_idx = np.empty(m, dtype=np.int64)
+    reason = np.empty(m, dtype=np.int64)
+    done = np.zeros(m, dtype=np.bool_)
+
+    for k in range(m):
+        if direction == LONG:
+            sl_price[k] = entry_price * (1.0 - sl_pct[k] / 100.0)
+            tp_price[k] = entry_price * (1.0 + tp_pct[k] / 100.0)
+        else:
+            sl_price[k] = entry_price * (1.0 + sl_pct[k] / 100.0)
+            tp_price[k] = entry_price * (1.0 - tp_pct[k] / 100.0)
+
+        af[k] = psar_step[k]
+        if psar_enabled[k]:
+            psar[k], ep[k], af[k], bull[k] = _psar_init(direction, entry_high, entry_low, psar_step[k])
+
+        if ts_enabled[k]:
+            trail[k], best[k] = _ts_init(direction, entry_price, ts_dist[k])
+
+    prev_low1 = entry_low
+    prev_low2 = entry_low
+    prev_high1 = entry_high
+    prev_high2 = entry_high
+
+    remaining = m
+    for i in range(entry_idx + 1, end_idx):
+        ts = dt_ns[i]
+        o  = ohlc[i, 0]
+        h  = ohlc[i, 1]
+        l  = ohlc[i, 2]
+        c  = ohlc[i, 3]
+        bullish = c >= o
+
+        for k in range(m):
+            if done[k]:
+                continue
+
+            # порядок проверок как в _simulate_range: time → PSAR → TS → SL/TP
+            hit, px, rsn = _check_time_exit(ts, exit_deadline_ts[k], o)
+
+            if not hit and psar_enabled[k]:
+                hit, psar[k], ep[k], af[k], bull[k], px, rsn = _psar_update_and_check(
+                    direction, o, h, l,
+                    psar[k], ep[k], af[k], bull[k],
+                    prev_low1, prev_low2,
+                    prev_high1, prev_high2,
+                    psar_step[k], psar_max[k]
+                )
+
+            if not hit and ts_enabled[k]:
+                hit, best[k], trail[k], px, rsn = _ts_update_and_check(direction, o, h, l, ts_dist[k], trail[k], best[k])
+
+            if not hit:
+                hit, px, rsn = _check_sl_tp(direction, bullish, o, h, l, sl_price[k], tp_price[k])
+
+            if hit:
+                exit_price[k] = px
+                exit_idx[k] = i
+                reason[k] = rsn
+                done[k] = True
+                remaining -= 1
+
+        if remaining == 0:
+            break
+
+        # update PSAR constraints
+        prev_low2 = prev_low1
+        prev_low1 = l
+        prev_high2 = prev_high1
+        prev_high1 = h
+
+    out = np.empty((m, 5), dtype=np.float64)
+    for k in range(m):
+        if not done[k]:
+            exit_idx[k] = end_idx - 1
+            exit_price[k] = ohlc[end_idx - 1, 3]
+            reason[k] = 2
+
+        # ---------- APPLY SLIPPAGE + COMMISSION ----------
+        px = exit_price[k] * (1.0 - slippage * direction)
+        out[k, 0] = (px - entry_price) * direction - commission * 2
+        out[k, 1] = entry_price
+        out[k, 2] = px
+        out[k, 3] = exit_idx[k]
+        out[k, 4] = reason[k]
+
+    return out
+
+@nb.njit(cache=True)
+def _grid_job(
+    dt_blocks, ohlc_blocks, block, entry_idx, exit_deadline_ts, direction,
+    sl_pct, tp_pct, psar_enabled, psar_step, psar_max, ts_enabled, ts_dist,
+    slippage, commission, k, pnl, entry_price, exit_price, exit_idx, exit_ns, reason
+):
+    b = block[k]
+    dt_ns = dt_blocks[b]
+    out = simulate_trade_grid(
+        dt_ns, ohlc_blocks[b], entry_idx[k], dt_ns.shape[0], exit_deadline_ts[k], direction[k],
+        sl_pct, tp_pct, psar_enabled, psar_step, psar_max, ts_enabled, ts_dist,
+        slippage, commission
+    )
+    for j in range(out.shape[0]):
+        xi = np.int64(out[j, 3])
+        pnl[k, j] = out[j, 0]
+        entry_price[k, j] = out[j, 1]
+        exit_price[k, j] = out[j, 2]
+        exit_idx[k, j] = xi
+        exit_ns[k, j] = dt_ns[xi]
+        reason[k, j] = np.int64(out[j, 4])
+
+@nb.njit(cache=True)
+def simulate_trades_grid_batch(
+    dt_blocks, ohlc_blocks, block, entry_idx, exit_deadline_ts, direction,
+    sl_pct, tp_pct, psar_enabled, psar_step, psar_max, ts_enabled, ts_dist,
+    slippage, commission
+):
+    """
+    n сделок × m конфигов выхода: каждая сделка проходит свои бары один раз для всех конфигов.
+    Бары — как в simulate_trades_batch; exit_deadline_ts — (n, m); sl_pct ... ts_dist — векторы длины m.
+    Возвращает (n, m): pnl, entry_price, exit_price, exit_idx (внутри блока), exit_ns, reason.
+    """
+    n = entry_idx.shape[0]
+    m = sl_pct.shape[0]
+    pnl = np.empty((n, m), dtype=np.float64)
+    entry_price = np.empty((n, m), dtype=np.float64)
+    exit_price = np.empty((n, m), dtype=np.float64)
+    exit_idx = np.empty((n, m), dtype=np.int64)
+    exit_ns = np.empty((n, m), dtype=np.int64)
+    reason = np.empty((n, m), dtype=np.int64)
+    for k in range(n):
+        _grid_job(
+            dt_blocks, ohlc_blocks, block, entry_idx, exit_deadline_ts, direction,
+            sl_pct, tp_pct, psar_enabled, psar_step, psar_max, ts_enabled, ts_dist,
+            slippage, commission, k, pnl, entry_price, exit_price, exit_idx, exit_ns, reason
+        )
+    return pnl, entry_price, exit_price, exit_idx, exit_ns, reason
+
+@nb.njit(parallel=True, cache=True)
+def simulate_trades_grid_batch_parallel(
+    dt_blocks, ohlc_blocks, block, entry_idx, exit_deadline_ts, direction,
+    sl_pct, tp_pct, psar_enabled, psar_step, psar_max, ts_enabled, ts_dist,
+    slippage, commission
+):
+    """То же, что simulate_trades_grid_batch, сделки по потокам numba (prange)."""
+    n = entry_idx.shape[0]
+    m = sl_pct.shape[0]
+    pnl = np.empty((n, m), dtype=np.float64)
+    entry_price = np.empty((n, m), dtype=np.float64)
+    exit_price = np.empty((n, m), dtype=np.float64)
+    exit_idx = np.empty((n, m), dtype=np.int64)
+    exit_ns = np.empty((n, m), dtype=np.int64)
+    reason = np.empty((n, m), dtype=np.int64)
+    for k in nb.prange(n):
+        _grid_job(
+            dt_blocks, ohlc_blocks, block, entry_idx, exit_deadline_ts, direction,
+            sl_pct, tp_pct, psar_enabled, psar_step, psar_max, ts_enabled, ts_dist,
+            slippage, commission, k, pnl, entry_price, exit_price, exit_idx, exit_ns, reason
+        )
+    return pnl, entry_price, exit_price, exit_idx, exit_ns, reason
+
+# =====================
+# Python glue
+# =====================
+
+def bars_from_frame(ohlc):
+    """(dt_ns int64, ohlc float64 (n,4)) из DataFrame с datetime/open/high/low/close."""
+    dt_ns = ohlc["datetime"].values.astype("datetime64[ns]").astype(np.int64)
+    ohlc_np = np.column_stack([
+        ohlc["open"].values,
+        ohlc["high"].values,
+        ohlc["low"].values,
+        ohlc["close"].values,
+    ]).astype(np.float64)
+    return dt_ns, ohlc_np
+
+def _utc_ns(dt) -> int:
+    ts = pd.Timestamp(dt)
+    return int(ts.tz_localize("UTC").value) if ts.tzinfo is None else int(ts.tz_convert("UTC").value)
+
+def _exit_deadline_ns(entry_dt, params, market_cache=None) -> np.int64:
+    if market_cache is not None:
+        return np.int64(add_market_minutes_cached(_utc_ns(entry_dt), int(params.holding_minutes), market_cache))
+
+    exit_deadline_dt = add_market_minutes(pd.Timestamp(entry_dt), int(params.holding_minutes))
+    return np.int64(pd.Timestamp(exit_deadline_dt).value)
+
+def prepare_entry(symbol, signal_time, params, ohlc, direction=LONG, market_cache=None, filter_mask=None, dt_ns=None):
+    """
+    Часть подготовки, не зависящая от sl/tp/holding: время/индекс входа и фильтры.
+    filter_mask: готовая маска compile_filters по барам ohlc (иначе filters() по строке).
+    dt_ns: ось времени баров (в т.ч. mmap) — вход ищется по ней, ohlc не нужен (нужна filter_mask).
+    Возвращает dict входа либо {"rejected": True, ...}.
+    """
     try:
         if market_cache is not None:
             entry_dt = compute_entry_time_cached(signal_time, params.delay_open, market_cache)
         else:
             entry_dt = compute_entry_time(signal_time, params.delay_open)
 
-        entry_idx = ohlc["datetime"].searchsorted(entry_dt)
+        if dt_ns is not None:
+            entry_idx = int(np.searchsorted(dt_ns, _utc_ns(entry_dt)))
+            n_bars = dt_ns.shape[0]
+        else:
+            entry_idx = ohlc["datetime"].searchsorted(entry_dt)
+            n_bars = len(ohlc)
 
-        if entry_idx >= len(ohlc):
+        if entry_idx >= n_bars:
             return {"symbol": symbol, "rejected": True, "reject_reason": "no_candles_after_entry"}
 
-        if not filters(ohlc.iloc[entry_idx], params):
+        passed = filter_mask[entry_idx] if filter_mask is not None else filters(ohlc.iloc[entry_idx], params)
+        if not passed:
             return {"symbol": symbol, "rejected": True, "reject_reason": "indicators_filter_failed"}
 
-        dt_ns = ohlc["datetime"].values.astype("datetime64[ns]").astype(np.int64)
+        return {
+            "symbol": symbol,
+            "direction": int(direction),
+            "entry_dt": entry_dt,
+            "entry_ns": _utc_ns(entry_dt),
+            "entry_idx": int(entry_idx),
+            "rejected": False,
+        }
 
-        if market_cache is not None:
-            entry_ns = int(pd.Timestamp(entry_dt).tz_localize("UTC").value) if pd.Timestamp(entry_dt).tzinfo is None else int(pd.Timestamp(entry_dt).tz_convert("UTC").value)
-            exit_deadline_ts = add_market_minutes_cached(entry_ns, int(params.holding_minutes), market_cache)
-            exit_deadline_ts = np.int64(exit_deadline_ts)
-        else:
-            entry_ts_utc = pd.Timestamp(entry_dt)
-            exit_deadline_dt = add_market_minutes(entry_ts_utc, int(params.holding_minutes))
-            exit_deadline_ts = np.int64(pd.Timestamp(exit_deadline_dt).value)
+    except Exception as e:
+        return {"symbol": symbol, "rejected": True, "reject_reason": str(e)}
+
+def prepare_trade(symbol, signal_time, params, ohlc, direction=LONG, market_cache=None):
+    """
+    Всё, что нужно до симуляции: время/индекс входа, фильтры, дедлайн по времени.
+    Возвращает dict сделки для batch-ядра либо {"rejected": True, ...}.
+    """
+    job = prepare_entry(symbol, signal_time, params, ohlc, direction, market_cache)
+    if job["rejected"]:
+        return job
+    try:
+        job["exit_deadline_ts"] = _exit_deadline_ns(job["entry_dt"], params, market_cache)
+    except Exception as e:
+        return {"symbol": symbol, "rejected": True, "reject_reason": str(e)}
+    return job
+
+def jobs_to_columns(jobs):
+    """Список входов (prepare_entry + ключ "block") → колонки для simulate_batch."""
+    n = len(jobs)
+    return {
+        "symbol": np.array([j["symbol"] for j in jobs], dtype=object),
+        "block": np.fromiter((j["block"] for j in jobs), dtype=np.int64, count=n),
+        "entry_idx": np.fromiter((j["entry_idx"] for j in jobs), dtype=np.int64, count=n),
+        "entry_ns": np.fromiter((j["entry_ns"] for j in jobs), dtype=np.int64, count=n),
+        "direction": np.fromiter((j["direction"] for j in jobs), dtype=np.int64, count=n),
+    }
+
+def _trade_record(symbol, direction, entry_dt, exit_dt, entry_price, exit_price, pnl, entry_idx, exit_idx, reason, params):
+    return_pct = pnl / entry_price * 100
+
+    hold_bars = int(exit_idx - entry_idx) if exit_idx >= entry_idx else 0
+    bar_minutes = int(getattr(params, "bar_minutes", 15))
+    hold_minutes = float(hold_bars * bar_minutes)
+
+    return {
+        "symbol": symbol,
+        "direction": int(direction),
+        "entry_dt": entry_dt,
+        "exit_dt": exit_dt,
+        "entry_price": float(entry_price),
+        "exit_price": float(exit_price),
+        "pnl": float(pnl),
+        "return_pct": float(return_pct),
+        "hold_bars": float(hold_bars),
+        "hold_minutes": float(hold_minutes),
+        "is_win": pnl > 0,
+        "exit_reason": EXIT_REASON[int(reason)],
+        "rejected": False
+    }
+
+def _use_threads(threads) -> bool:
+    """threads — StrategyParams.threads; True — параллельное ядро."""
+    threads = int(threads)
+    if threads == 1:
+        return False
+    max_threads = nb.config.NUMBA_NUM_THREADS
+    nb.set_num_threads(max_threads if threads <= 0 else min(threads, max_threads))
+    return True
+
+def _readonly(a, dtype):
+    """C-contiguous read-only view (копия — только если тип/раскладка не те): у всех блоков один тип numba."""
+    a = np.ascontiguousarray(a, dtype=dtype)
+    if a.flags.writeable:
+        a = a.view()
+        a.flags.writeable = False
+    return a
+
+# блоки последнего прогона: в Optuna набор символов одинаков от трайла к трайлу
+_BLOCKS = {"key": None, "blocks": None, "value": None, "touch": {}}
+
+def _block_arrays(blocks):
+    """
+    typed List баров и touch-таблиц по блокам для batch-ядер. Бары не склеиваются:
+    mmap (npy/panel) уходят в ядро как есть, touch-таблицы строятся только по барам символа.
+    """
+    # blocks держим в кэше — пока они живы, id их массивов не переиспользуются
+    key = tuple(id(b[0]) for b in blocks)
+    if _BLOCKS["key"] != key:
+        from numba.typed import List
+
+        old_touch = _BLOCKS["touch"]
+        touch = {}
+        dt_blocks, ohlc_blocks, hi_blocks, lo_blocks = List(), List(), List(), List()
+        for dt_ns, ohlc in blocks:
+            ohlc = _readonly(ohlc, np.float64)
+            # таблицы символа переживают смену набора блоков (другой delay_open/фильтр)
+            tables = old_touch.get(id(ohlc)) or touch.get(id(ohlc))
+            if tables is None or tables[0] is not ohlc:
+                tables = (ohlc,) + build_touch_tables(ohlc)
+            touch[id(ohlc)] = tables
+            dt_blocks.append(_readonly(dt_ns, np.int64))
+            ohlc_blocks.append(ohlc)
+            hi_blocks.append(tables[1])
+            lo_blocks.append(tables[2])
+        _BLOCKS["value"] = (dt_blocks, ohlc_blocks, hi_blocks, lo_blocks)
+        _BLOCKS["blocks"] = list(blocks)
+        _BLOCKS["touch"] = touch
+        _BLOCKS["key"] = key
+    return _BLOCKS["value"]
+
+def validate_jobs(jobs, exit_deadline_ts, blocks) -> np.ndarray:
+    """
+    Проверка входов перед batch-ядром (ядро границы не проверяет, одна плохая
+    сделка не должна ронять весь прогон). Возвращает object-массив причин отказа,
+    None — сделка валидна.
+    """
+    n = int(jobs["entry_idx"].shape[0])
+    reasons = np.full(n, None, dtype=object)
+    if n == 0:
+        return reasons
+
+    block = jobs["block"]
+    entry_idx = jobs["entry_idx"]
+    lengths = np.array([b[0].shape[0] for b in blocks], dtype=np.int64)
+    deadline = np.asarray(exit_deadline_ts, dtype=np.int64)
+
+    bad_block = (block < 0) | (block >= lengths.shape[0])
+    blen = lengths[np.where(bad_block, 0, block)] if lengths.shape[0] else np.zeros(n, dtype=np.int64)
+    bad_idx = ~bad_block & ((entry_idx < 0) | (entry_idx >= blen))
+    bad_direction = (jobs["direction"] != LONG) & (jobs["direction"] != SHORT)
+    bad_deadline = deadline < jobs["entry_ns"]
+
+    bad_bar = np.zeros(n, dtype=np.bool_)
+    for k in np.flatnonzero(~(bad_block | bad_idx)).tolist():
+        bar = blocks[block[k]][1][entry_idx[k]]
+        bad_bar[k] = not (np.isfinite(bar).all() and bar[0] > 0)
+
+    reasons[bad_deadline] = "bad_exit_deadline"
+    reasons[bad_direction] = "bad_direction"
+    reasons[bad_bar] = "bad_entry_bar"
+    reasons[bad_idx] = "entry_out_of_range"
+    reasons[bad_block] = "bad_block"
+    return reasons
+
+def take_jobs(jobs, idx):
+    """Подмножество колонок jobs_to_columns (индексы или bool-маска)."""
+    return {name: col[idx] for name, col in jobs.items()}
+
+def simulate_batch(jobs, exit_deadline_ts, blocks, params):
+    """
+    Симулирует подготовленные сделки одним вызовом ядра.
+    jobs: колонки jobs_to_columns; exit_deadline_ts — int64 ns по каждой сделке.
+    blocks: список (dt_ns, ohlc) — бары символов, на которые ссылается jobs["block"].
+    Возвращает TradeLog в порядке jobs.
+    """
+    n = int(jobs["entry_idx"].shape[0])
+    if n == 0:
+        return TradeLog.empty()
+
+    dt_blocks, ohlc_blocks, hi_blocks, lo_blocks = _block_arrays(blocks)
+
+    block = jobs["block"]
+    entry_idx = jobs["entry_idx"]
+    direction = jobs["direction"]
+    exit_deadline_ts = np.asarray(exit_deadline_ts, dtype=np.int64)
 
-        ohlc_np = np.column_stack([
-            ohlc["open"].values,
-            ohlc["high"].values,
-            ohlc["low"].values,
-            ohlc["close"].values,
-        ]).astype(np.float64)
+    kernel = simulate_trades_batch_parallel if _use_threads(params.threads) else simulate_trades_batch
+    pnl, entry_price, exit_price, exit_idx, exit_ns, reason = kernel(
+        dt_blocks,
+        ohlc_blocks,
+        hi_blocks,
+        lo_blocks,
+        block,
+        entry_idx,
+        exit_deadline_ts,
+        direction,
+        float(params.sl),
+        float(params.tp),
+        bool(params.psar_enabled),
+        float(params.psar_step),
+        float(params.psar_max),
+        bool(params.ts_enabled),
+        float(getattr(params, "ts_dist", 1.0)),
+        float(params.slippage),
+        float(params.commission)
+    )
+
+    hold_bars = np.maximum(exit_idx - entry_idx, 0)
+
+    return TradeLog(
+        symbol=jobs["symbol"],
+        direction=direction.astype(np.int8),
+        entry_ns=jobs["entry_ns"],
+        exit_ns=exit_ns,
+        entry_price=entry_price,
+        exit_price=exit_price,
+        pnl=pnl,
+        return_pct=pnl / entry_price * 100,
+        hold_bars=hold_bars,
+        hold_minutes=(hold_bars * int(getattr(params, "bar_minutes", 15))).astype(np.float64),
+        exit_reason=reason.astype(np.int8),
+    )
+
+def _config_vectors(configs):
+    return (
+        np.array([c.sl for c in configs], dtype=np.float64),
+        np.array([c.tp for c in configs], dtype=np.float64),
+        np.array([c.psar_enabled for c in configs], dtype=np.bool_),
+        np.array([c.psar_step for c in configs], dtype=np.float64),
+        np.array([c.psar_max for c in configs], dtype=np.float64),
+        np.array([c.ts_enabled for c in configs], dtype=np.bool_),
+        np.array([getattr(c, "ts_dist", 1.0) for c in configs], dtype=np.float64),
+    )
+
+def simulate_batch_grid(jobs, exit_deadline_ts, blocks, configs, params) -> list[TradeLog]:
+    """
+    Как simulate_batch, но для m конфигов выхода с общими входами (трайлы одного ключа EntryCache).
+    exit_deadline_ts — (n, m) по holding_minutes каждого конфига;
+    slippage/commission/threads/bar_minutes берутся из params.
+    Возвращает TradeLog на каждый конфиг (в порядке jobs).
+    """
+    n = int(jobs["entry_idx"].shape[0])
+    if n == 0:
+        return [TradeLog.empty() for _ in configs]
+
+    dt_blocks, ohlc_blocks, _, _ = _block_arrays(blocks)
+
+    block = jobs["block"]
+    entry_idx = jobs["entry_idx"]
+    direction = jobs["direction"]
+    deadlines = np.ascontiguousarray(exit_deadline_ts, dtype=np.int64)
+
+    kernel = simulate_trades_grid_batch_parallel if _use_threads(params.threads) else simulate_trades_grid_batch
+    pnl, entry_price, exit_price, exit_idx, exit_ns, reason = kernel(
+        dt_blocks, ohlc_blocks, block, entry_idx, deadlines, direction,
+        *_config_vectors(configs),
+        float(params.slippage),
+        float(params.commission)
+    )
+
+    bar_minutes = int(getattr(params, "bar_minutes", 15))
+    logs = []
+    for j in range(len(configs)):
+        hold_bars = np.maximum(exit_idx[:, j] - entry_idx, 0)
+        logs.append(TradeLog(
+            symbol=jobs["symbol"],
+            direction=direction.astype(np.int8),
+            entry_ns=jobs["entry_ns"],
+            exit_ns=exit_ns[:, j].copy(),
+            entry_price=entry_price[:, j].copy(),
+            exit_price=exit_price[:, j].copy(),
+            pnl=pnl[:, j].copy(),
+            return_pct=pnl[:, j] / entry_price[:, j] * 100,
+            hold_bars=hold_bars,
+            hold_minutes=(hold_bars * bar_minutes).astype(np.float64),
+            exit_reason=reason[:, j].astype(np.int8),
+        ))
+    return logs
+
+def simulate_trade(symbol, signal_time, params, ohlc, direction=LONG, market_cache=None, bars=None):
+    """bars: готовые (dt_ns, ohlc) символа (load_market_bars), иначе извлекаются из ohlc."""
+    try:
+        job = prepare_trade(symbol, signal_time, params, ohlc, direction, market_cache)
+        if job["rejected"]:
+            return job
+
+        dt_ns, ohlc_np = bars if bars is not None else bars_from_frame(ohlc)
+        entry_idx = job["entry_idx"]
 
         pnl, entry_price, exit_price, exit_idx, reason = simulate_trade_core(
             dt_ns,
             ohlc_np,
             entry_idx,
-            exit_deadline_ts,
+            job["exit_deadline_ts"],
             direction,
             params.sl,
             params.tp,
@@ -333,27 +1237,11 @@ def simulate_trade(symbol, signal_time, params, ohlc, direction=LONG, market_cac
         )
 
         exit_dt = ohlc.iloc[exit_idx]["datetime"]
-        return_pct = pnl / entry_price * 100
-
-        hold_bars = int(exit_idx - entry_idx) if exit_idx >= entry_idx else 0
-        bar_minutes = int(getattr(params, "bar_minutes", 15))
-        hold_minutes = float(hold_bars * bar_minutes)
-
-        return {
-            "symbol": symbol,
-            "direction": int(direction),
-            "entry_dt": entry_dt,
-            "exit_dt": exit_dt,
-            "entry_price": float(entry_price),
-            "exit_price": float(exit_price),
-            "pnl": float(pnl),
-            "return_pct": float(return_pct),
-            "hold_bars": float(hold_bars),
-            "hold_minutes": float(hold_minutes),
-            "is_win": pnl > 0,
-            "exit_reason": EXIT_REASON[reason],
-            "rejected": False
-        }
+        return _trade_record(
+            symbol, direction, job["entry_dt"], exit_dt,
+            entry_price, exit_price, pnl,
+            entry_idx, exit_idx, reason, params
+        )
 
     except Exception as e:
-        return {"symbol": symbol, "rejected": True, "reject_reason": str(e)}
\ No newline at end of file
+        return {"symbol": symbol, "rejected": True, "reject_reason": str(e)}
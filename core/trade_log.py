@@ -0,0 +1,109 @@
+from dataclasses import dataclass, fields
+
+import numpy as np
+import pandas as pd
+
+EXIT_REASON = {0: "sl", 1: "tp", 2: "time_exit", 3: "psar", 4: "ts"}
+
+_REASON_NAMES = np.array([EXIT_REASON[k] for k in sorted(EXIT_REASON)], dtype=object)
+
+
+@dataclass
+class TradeLog:
+    """
+    Сделки бэктеста по колонкам (одна строка = одна сделка).
+    Время — int64 UTC ns, причина выхода — код из EXIT_REASON.
+    """
+    symbol: np.ndarray        # object (str)
+    direction: np.ndarray     # int8: 1 long, -1 short
+    entry_ns: np.ndarray      # int64
+    exit_ns: np.ndarray       # int64
+    entry_price: np.ndarray   # float64
+    exit_price: np.ndarray    # float64
+    pnl: np.ndarray           # float64
+    return_pct: np.ndarray    # float64
+    hold_bars: np.ndarray     # int64
+    hold_minutes: np.ndarray  # float64
+    exit_reason: np.ndarray   # int8
+
+    @classmethod
+    def empty(cls) -> "TradeLog":
+        return cls(
+            symbol=np.empty(0, dtype=object),
+            direction=np.empty(0, dtype=np.int8),
+            entry_ns=np.empty(0, dtype=np.int64),
+            exit_ns=np.empty(0, dtype=np.int64),
+            entry_price=np.empty(0, dtype=np.float64),
+            exit_price=np.empty(0, dtype=np.float64),
+            pnl=np.empty(0, dtype=np.float64),
+            return_pct=np.empty(0, dtype=np.float64),
+            hold_bars=np.empty(0, dtype=np.int64),
+            hold_minutes=np.empty(0, dtype=np.float64),
+            exit_reason=np.empty(0, dtype=np.int8),
+        )
+
+    def __len__(self) -> int:
+        return int(self.pnl.shape[0])
+
+    def take(self, idx) -> "TradeLog":
+        """Подмножество/перестановка строк (idx — индексы или bool-маска)."""
+        return TradeLog(**{f.name: getattr(self, f.name)[idx] for f in fields(self)})
+
+    @classmethod
+    def concat(cls, logs) -> "TradeLog":
+        logs = [log for log in logs if len(log)]
+        if not logs:
+            return cls.empty()
+        return cls(**{
+            f.name: np.concatenate([getattr(log, f.name) for log in logs])
+            for f in fields(cls)
+        })
+
+    @property
+    def is_win(self) -> np.ndarray:
+        return self.pnl > 0
+
+    def reason_counts(self) -> dict[str, int]:
+        codes, counts = np.unique(self.exit_reason, return_counts=True)
+        return {EXIT_REASON.get(int(c), "unknown"): int(n) for c, n in zip(codes, counts)}
+
+    def to_frame(self) -> pd.DataFrame:
+        """DataFrame в формате прежних trade-dict (для сохранения/визуализации)."""
+        return pd.DataFrame({
+            "symbol": self.symbol,
+            "direction": self.direction.astype(np.int64),
+            "entry_dt": pd.to_datetime(self.entry_ns.view("datetime64[ns]")).tz_localize("UTC"),
+            "exit_dt": pd.to_datetime(self.exit_ns.view("datetime64[ns]")).tz_localize("UTC"),
+            "entry_price": self.entry_price,
+            "exit_price": self.exit_price,
+            "pnl": self.pnl,
+            "return_pct": self.return_pct,
+            "hold_bars": self.hold_bars.astype(np.float64),
+            "hold_minutes": self.hold_minutes,
+            "is_win": self.is_win,
+            "exit_reason": _REASON_NAMES[self.exit_reason],
+            "rejected": np.zeros(len(self), dtype=bool),
+        }, copy=False)
+
+    def to_arrow(self):
+        """pyarrow.Table без копирования числовых колонок."""
+        import pyarrow as pa
+
+        return pa.table({
+            "symbol": pa.array(self.symbol, type=pa.string()),
+            "direction": self.direction,
+            "entry_dt": pa.array(self.entry_ns, type=pa.timestamp("ns", tz="UTC")),
+            "exit_dt": pa.array(self.exit_ns, type=pa.timestamp("ns", tz="UTC")),
+            "entry_price": self.entry_price,
+            "exit_price": self.exit_price,
+            "pnl": self.pnl,
+            "return_pct": self.return_pct,
+            "hold_bars": self.hold_bars,
+            "hold_minutes": self.hold_minutes,
+            "exit_reason": pa.DictionaryArray.from_arrays(
+                self.exit_reason, pa.array(list(_REASON_NAMES), type=pa.string())
+            ),
+        })
+
+    def to_records(self) -> list[dict]:
+        return self.to_frame().to_dict("records")
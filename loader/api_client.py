@@ -1,5 +1,7 @@
 import os
-import requests
+import threading
+import time
+from email.utils import parsedate_to_datetime
 import pandas as pd
 import logging
 from typing import Optional
@@ -7,8 +9,135 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# можно переопределить (prefetch --base_url), например на локальный тестовый сервер
 BASE_URL = os.getenv("DATA_BASE_URL")
 
+# пул соединений / повторы / лимит запросов в секунду (0 — без лимита)
+POOL_SIZE = 16
+RETRIES = 3
+BACKOFF = 0.5
+RATE_LIMIT = 0.0
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class RateLimiter:
+    """
+    Не больше rate запросов в секунду на процесс (равномерно, общий для всех потоков).
+    Через лимитер проходит каждая попытка, включая повторы; pause — общая пауза (Retry-After на 429).
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._next = max(self._next, time.monotonic() + seconds)
+
+
+_limiter = RateLimiter(RATE_LIMIT)
+
+
+def configure(base_url: str | None = None, pool_size: int | None = None, retries: int | None = None,
+              backoff: float | None = None, rate_limit: float | None = None):
+    """Меняет настройки клиента; сессия пересоздаётся при следующем запросе."""
+    global BASE_URL, POOL_SIZE, RETRIES, BACKOFF, RATE_LIMIT, _session, _limiter
+    with _session_lock:
+        if base_url is not None:
+            BASE_URL = base_url.rstrip("/")
+        if pool_size is not None:
+            POOL_SIZE = int(pool_size)
+        if retries is not None:
+            RETRIES = int(retries)
+        if backoff is not None:
+            BACKOFF = float(backoff)
+        if rate_limit is not None:
+            RATE_LIMIT = float(rate_limit)
+            _limiter = RateLimiter(RATE_LIMIT)
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def get_session():
+    """Общая requests.Session: keep-alive пул на POOL_SIZE соединений; повторы — в _request."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            # max_retries=0: повтор внутри urllib3 прошёл бы мимо лимитера
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=0)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+def _retry_after(response) -> float | None:
+    """Retry-After в секундах (число или HTTP-дата) либо None."""
+    raw = response.headers.get("Retry-After")
+    if not raw:
+        return None
+    try:
+        return max(0.0, float(raw))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(raw).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _request(method: str, path: str, **kwargs):
+    """
+    Запрос с повторами на 429/5xx и обрыв соединения (addChartSymbols — POST, но только чтение).
+    Каждая попытка ждёт лимитер; пауза — Retry-After, иначе BACKOFF * 2^попытка;
+    429 ставит паузу всем потокам процесса.
+    """
+    import requests
+
+    session = get_session()
+    url = f"{BASE_URL}{path}"
+    for attempt in range(RETRIES + 1):
+        _limiter.wait()
+        try:
+            response = session.request(method, url, **kwargs)
+        except requests.ConnectionError:
+            if attempt == RETRIES:
+                raise
+            time.sleep(BACKOFF * 2 ** attempt)
+            continue
+
+        if response.status_code not in RETRY_STATUS or attempt == RETRIES:
+            response.raise_for_status()
+            return response
+
+        delay = _retry_after(response)
+        if delay is None:
+            delay = BACKOFF * 2 ** attempt
+        response.close()
+        if response.status_code == 429:
+            _limiter.pause(delay)
+        else:
+            time.sleep(delay)
+
 USA_MARKETS = {
     "NASDAQ",
     "NYSE",
@@ -21,13 +150,13 @@ def search_symbol(symbol: str) -> Optional[dict]:
     """
     Возвращает instrument {symbol, source} для USA рынков
     """
-    response = requests.get(
-        f"{BASE_URL}/api/marketData/symbolSearch/",
+    response = _request(
+        "GET",
+        "/api/marketData/symbolSearch/",
         json={"data": symbol},
         timeout=15
     )
 
-    response.raise_for_status()
     instruments = response.json().get("result", [])
 
     for instrument in instruments:
@@ -43,13 +172,13 @@ def fetch_candles(instrument: dict, limit: int) -> pd.DataFrame:
         "limit": limit
     }
 
-    response = requests.post(
-        f"{BASE_URL}/api/marketData/addChartSymbols",
+    response = _request(
+        "POST",
+        "/api/marketData/addChartSymbols",
         json=payload,
         timeout=30
     )
 
-    response.raise_for_status()
     data = response.json().get("result", [])
     if not data:
         logging.warning(f"Not found data " + str(instrument))
@@ -66,7 +195,10 @@ def fetch_candles(instrument: dict, limit: int) -> pd.DataFrame:
     return ohlc[cols]
 
 def fetch_market_data(symbol: str, limit: int) -> pd.DataFrame:
-    instrument = search_symbol(symbol)
+    # карта инструментов на диске: без symbolSearch для известных и недавно не найденных
+    from loader.instrument_map import resolve_instrument
+
+    instrument = resolve_instrument(symbol)
 
     if instrument is None:
         logging.warning(f"Symbol {symbol} not found on USA markets")
@@ -0,0 +1,154 @@
+import argparse
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from loader import market_index
+from loader.cache import cached
+
+# несжатые бары для симулятора: data/bars/<SYMBOL>/{dt_ns.npy, ohlc.npy, meta.json}
+# открываются через mmap — все процессы делят page cache ОС, копии в памяти процесса нет.
+# parquet (data/ohlc) остаётся архивным форматом.
+BAR_STORE_PATH = Path("data/bars")
+
+# HYPERTRADE_BAR_BACKEND: parquet (по умолчанию) | npy | panel (loader/panel_store.py)
+BAR_BACKEND = os.getenv("HYPERTRADE_BAR_BACKEND", "parquet")
+
+
+def _symbol_dir(symbol: str) -> Path:
+    return BAR_STORE_PATH / symbol
+
+
+def write_bars(symbol: str, dt_ns: np.ndarray, ohlc: np.ndarray, source_hash: str | None = None):
+    """
+    Атомарно (через временный каталог) пишет бары символа; source_hash — hash parquet из market_index.
+    В meta ещё отпечаток баров (bars_hash) — load_aligned_columns сверяет по нему индикаторы без чтения parquet.
+    """
+    from loader.market_loader import bars_hash
+
+    final = _symbol_dir(symbol)
+    tmp = final.with_name(f".{symbol}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    np.save(tmp / "dt_ns.npy", np.ascontiguousarray(dt_ns, dtype=np.int64))
+    np.save(tmp / "ohlc.npy", np.ascontiguousarray(ohlc, dtype=np.float64))
+    (tmp / "meta.json").write_text(json.dumps({
+        "rows": int(dt_ns.shape[0]),
+        "source_hash": source_hash,
+        "bars_hash": bars_hash(dt_ns, ohlc),
+    }))
+
+    old = final.with_name(f".{symbol}.{os.getpid()}.old")
+    if final.exists():
+        os.replace(final, old)
+    os.replace(tmp, final)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+@cached
+def _read_meta(path_str: str, mtime_ns: int) -> dict:
+    return json.loads(Path(path_str).read_text())
+
+
+@cached
+def _open_bars(path_str: str, mtime_ns: int) -> tuple[np.ndarray, np.ndarray]:
+    root = Path(path_str)
+    # view как обычный ndarray (numba/searchsorted), данные остаются в mmap
+    dt_ns = np.load(root / "dt_ns.npy", mmap_mode="r").view(np.ndarray)
+    ohlc = np.load(root / "ohlc.npy", mmap_mode="r").view(np.ndarray)
+    return dt_ns, ohlc
+
+
+def _fresh_meta(symbol: str, check_source: bool = True) -> tuple[Path, int, dict] | None:
+    root = _symbol_dir(symbol)
+    meta_path = root / "meta.json"
+    if not meta_path.exists():
+        return None
+    mtime_ns = meta_path.stat().st_mtime_ns
+    meta = _read_meta(str(meta_path), mtime_ns)
+
+    if check_source:
+        cov = market_index.coverage(symbol)
+        if cov is not None and meta.get("source_hash") != cov.get("hash"):
+            return None
+    return root, mtime_ns, meta
+
+
+def load_bars(symbol: str, check_source: bool = True) -> tuple[np.ndarray, np.ndarray] | None:
+    """
+    (dt_ns, ohlc) как read-only memmap либо None, если бары не выгружены
+    или parquet символа изменился после выгрузки (сверка по hash из market_index).
+    """
+    fresh = _fresh_meta(symbol, check_source)
+    if fresh is None:
+        return None
+    root, mtime_ns, _ = fresh
+    return _open_bars(str(root), mtime_ns)
+
+
+def load_stamp(symbol: str) -> tuple[int, str] | None:
+    """(строк, bars_hash) актуальной выгрузки из meta либо None (нет выгрузки/старый формат meta)."""
+    fresh = _fresh_meta(symbol)
+    if fresh is None or fresh[2].get("bars_hash") is None:
+        return None
+    return int(fresh[2]["rows"]), fresh[2]["bars_hash"]
+
+
+def to_npy(symbols=None) -> dict:
+    """parquet -> npy для symbols (по умолчанию все символы хранилища); актуальные пропускаются."""
+    from loader.market_loader import MARKET_PATH, load_market_bars_parquet
+
+    symbols = symbols or [p.stem for p in sorted(MARKET_PATH.glob("*.parquet"))]
+    stats = {"written": 0, "fresh": 0, "missing": 0}
+    for symbol in symbols:
+        if load_bars(symbol) is not None:
+            stats["fresh"] += 1
+            continue
+        bars = load_market_bars_parquet(symbol)
+        if bars is None:
+            stats["missing"] += 1
+            continue
+        cov = market_index.coverage(symbol)
+        write_bars(symbol, bars[0], bars[1], cov.get("hash") if cov else None)
+        stats["written"] += 1
+    return stats
+
+
+def to_parquet(symbols=None) -> dict:
+    """npy -> parquet (восстановление архива; в npy только datetime и OHLC)."""
+    import pandas as pd
+
+    from loader.market_loader import save_market
+
+    symbols = symbols or [p.name for p in sorted(BAR_STORE_PATH.iterdir()) if (p / "meta.json").exists()]
+    stats = {"written": 0, "missing": 0}
+    for symbol in symbols:
+        bars = load_bars(symbol, check_source=False)
+        if bars is None:
+            stats["missing"] += 1
+            continue
+        dt_ns, ohlc = bars
+        save_market(symbol, pd.DataFrame({
+            "datetime": pd.to_datetime(np.asarray(dt_ns), utc=True),
+            "open": ohlc[:, 0],
+            "high": ohlc[:, 1],
+            "low": ohlc[:, 2],
+            "close": ohlc[:, 3],
+        }))
+        stats["written"] += 1
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Конвертация баров parquet <-> npy (mmap)")
+    parser.add_argument("--to", choices=["npy", "parquet"], default="npy")
+    parser.add_argument("--symbols", type=str, default=None, help="список через запятую, по умолчанию все")
+    args = parser.parse_args()
+
+    symbols = [s.strip() for s in args.symbols.split(",") if s.strip()] if args.symbols else None
+    stats = to_npy(symbols) if args.to == "npy" else to_parquet(symbols)
+    print(f"Bar store ({args.to}): {stats}")
@@ -0,0 +1,153 @@
+import mmap
+import os
+import sys
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+import numpy as np
+import pandas as pd
+
+# бюджет общего кэша загрузчика в байтах (HYPERTRADE_CACHE_BYTES, по умолчанию 2 GiB)
+CACHE_BYTES_ENV = "HYPERTRADE_CACHE_BYTES"
+DEFAULT_CACHE_BYTES = 2 * 1024 ** 3
+
+
+def _budget_from_env() -> int:
+    raw = os.getenv(CACHE_BYTES_ENV)
+    return int(float(raw)) if raw else DEFAULT_CACHE_BYTES
+
+
+def _buffer(arr: np.ndarray) -> tuple[int, int]:
+    """(id владельца памяти, его размер) для массива и любых view на него."""
+    owner = arr
+    while isinstance(owner.base, np.ndarray):
+        owner = owner.base
+    if owner.base is None:
+        return id(owner), int(owner.nbytes)
+    if isinstance(owner.base, mmap.mmap):
+        # файл в page cache ОС, не в памяти процесса: считаем только байты самого view
+        return id(arr), int(arr.nbytes)
+    try:
+        return id(owner.base), memoryview(owner.base).nbytes
+    except TypeError:
+        return id(owner), int(owner.nbytes)
+
+
+def sizeof(value, _seen: set | None = None) -> int:
+    """
+    Оценка памяти значения: DataFrame — deep (с object-колонками), ndarray — по буферу-владельцу
+    (view на общий буфер внутри одного значения считается один раз), контейнеры — рекурсивно.
+    """
+    seen = set() if _seen is None else _seen
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, np.ndarray):
+        key, nbytes = _buffer(value)
+        if key in seen:
+            return 0
+        seen.add(key)
+        return nbytes
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(sizeof(v, seen) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(k, seen) + sizeof(v, seen) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+class LoaderCache:
+    """
+    LRU с бюджетом в байтах вместо числа записей.
+    Ключ — (имя функции, path_str, mtime_ns, ...): при появлении новой версии файла
+    записи со старым mtime того же пути удаляются сразу, не дожидаясь вытеснения.
+    """
+
+    def __init__(self, max_bytes: int | None = None):
+        self.max_bytes = _budget_from_env() if max_bytes is None else int(max_bytes)
+        self._data = OrderedDict()   # key -> (value, nbytes)
+        self._mtimes = {}            # path_str -> mtime_ns последней версии
+        self._lock = threading.RLock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value):
+        nbytes = sizeof(value)
+        with self._lock:
+            path_str, mtime_ns = key[1], key[2]
+            if self._mtimes.get(path_str, mtime_ns) != mtime_ns:
+                self.invalidate(path_str)
+            self._mtimes[path_str] = mtime_ns
+
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            # значение больше всего бюджета не кэшируем
+            if nbytes > self.max_bytes:
+                return
+            self._data[key] = (value, nbytes)
+            self.bytes += nbytes
+            while self.bytes > self.max_bytes:
+                _, (_, freed) = self._data.popitem(last=False)
+                self.bytes -= freed
+                self.evictions += 1
+
+    def invalidate(self, path_str: str):
+        """Удаляет все записи файла (все функции, все версии)."""
+        with self._lock:
+            for key in [k for k in self._data if k[1] == path_str]:
+                self.bytes -= self._data.pop(key)[1]
+            self._mtimes.pop(path_str, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._mtimes.clear()
+            self.bytes = 0
+
+    def info(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+LOADER_CACHE = LoaderCache()
+
+
+def cached(fn):
+    """
+    Замена lru_cache для читателей файлов вида fn(path_str, mtime_ns, *args):
+    результат хранится в LOADER_CACHE под общим бюджетом памяти.
+    """
+    name = f"{fn.__module__}.{fn.__qualname__}"
+
+    @wraps(fn)
+    def wrapper(path_str: str, mtime_ns: int, *args):
+        key = (name, path_str, mtime_ns) + args
+        value = LOADER_CACHE.get(key)
+        if value is None:
+            value = fn(path_str, mtime_ns, *args)
+            LOADER_CACHE.put(key, value)
+        return value
+
+    return wrapper
@@ -1,7 +1,7 @@
+import numpy as np
 import pandas as pd
-from loader.market_loader import ensure_market_history
-from loader.indicator_calc import calculate_indicators
-from loader.indicator_store import load_indicator, save_indicator
+from loader.market_loader import ensure_market_history, frame_to_bars, history_gaps, load_market_bars, load_market_bars_window
+from loader.indicator_store import load_aligned_columns, sync_indicators
 
 def _required_indicator_cols(indicator_config) -> list[str]:
     cols = []
@@ -22,6 +22,10 @@ def _required_indicator_cols(indicator_config) -> list[str]:
     
     return cols
 
+# False — недостающие колонки считаются в памяти без перезаписи файла
+# (во время study после прогрева банка: без записей и сброса кэша посреди трайлов)
+PERSIST_INDICATORS = True
+
 def ensure_market_data(symbol: str, start: pd.Timestamp, indicator_config) -> pd.DataFrame | None:
     market_df = ensure_market_history(symbol, start)
     if market_df is None or market_df.empty:
@@ -31,23 +35,48 @@ def ensure_market_data(symbol: str, start: pd.Timestamp, indicator_config) -> pd
     if not required_cols:
         return market_df
 
-    ind_df = load_indicator(symbol)
-    if ind_df is None or ind_df.empty:
-        ind_df = calculate_indicators(market_df, indicator_config)
-        save_indicator(symbol, ind_df)
-
-    missing = list(set(required_cols) - set(ind_df.columns))
+    # быстрый путь: файл выровнен с OHLC — читаем только нужные колонки и кладём по позиции
+    cols = load_aligned_columns(symbol, required_cols)
+    if cols is not None and len(market_df) == len(next(iter(cols.values()))):
+        return market_df.assign(**cols)
 
-    if missing:
-        new_df = calculate_indicators(market_df, indicator_config)
-        new_df = new_df[["datetime"] + missing]
-        ind_df = ind_df.merge(new_df, on="datetime", how="left")
-        save_indicator(symbol, ind_df)
+    # новые бары в хвосте продлеваются по сохранённому состоянию, недостающие колонки досчитываются
+    ind_df = sync_indicators(symbol, market_df, required_cols, persist=PERSIST_INDICATORS)
 
     need = ["datetime"] + required_cols
     for col in need:
         if col not in ind_df.columns:
             raise KeyError(f"Indicator column missing: {col}")
 
+    # sync_indicators считает на барах market_df, так что строки совпадают
+    if len(ind_df) == len(market_df) and (ind_df["datetime"].values == market_df["datetime"].values).all():
+        return market_df.assign(**{col: ind_df[col].to_numpy() for col in required_cols})
+
     ind_use = ind_df[need]
     return market_df.merge(ind_use, on="datetime", how="left")
+
+def ensure_market_arrays(symbol: str, start: pd.Timestamp, indicator_config):
+    """
+    Бары символа (dt_ns, ohlc) и нужные колонки индикаторов построчно к ним — без DataFrame истории:
+    с npy/panel бары — mmap, с parquet — только row group начиная с start (входы не раньше сигнала);
+    индикаторы — проекция колонок файла, выровненного с барами, срезанная по смещению окна.
+    Если нужна догрузка из API или индикаторы не выровнены — через ensure_market_data.
+    Возвращает (bars, {колонка: массив}) либо None.
+    """
+    required_cols = _required_indicator_cols(indicator_config)
+    if not any(history_gaps(symbol, start)):
+        window = load_market_bars_window(symbol, start)
+        if window is not None and window[0][0].shape[0]:
+            bars, offset = window
+            n = bars[0].shape[0]
+            cols = load_aligned_columns(symbol, required_cols) if required_cols else {}
+            if cols is not None and all(v.shape[0] >= offset + n for v in cols.values()):
+                return bars, {col: v[offset:offset + n] for col, v in cols.items()}
+
+    market_df = ensure_market_data(symbol, start, indicator_config)
+    if market_df is None:
+        return None
+    bars = load_market_bars(symbol)
+    if bars is None or bars[0].shape[0] != len(market_df):
+        bars = frame_to_bars(market_df)
+    return bars, {col: market_df[col].to_numpy(dtype=np.float64) for col in required_cols}
@@ -0,0 +1,52 @@
+import logging
+
+import pandas as pd
+
+from loader.market_loader import ensure_market_history
+from loader.indicator_store import load_indicator, sync_indicators
+from loader.signals import as_signal_table
+
+
+def signal_symbol_starts(signals) -> dict[str, pd.Timestamp]:
+    """symbol -> самый ранний сигнал, в котором он встречается."""
+    return {symbol: first for symbol, (first, _) in signal_symbol_ranges(signals).items()}
+
+
+def signal_symbol_ranges(signals) -> dict[str, tuple[pd.Timestamp, pd.Timestamp]]:
+    """symbol -> (самый ранний, самый поздний) сигнал, в котором он встречается."""
+    signals = as_signal_table(signals)
+    dts = pd.Series(signals.datetime[signals.signal_id])
+    ranges = dts.groupby(signals.symbol, sort=False).agg(["min", "max"])
+    return {symbol: (row["min"], row["max"]) for symbol, row in ranges.iterrows()}
+
+
+def warm_symbol(symbol: str, start, columns) -> str:
+    """
+    Досчитывает в файл индикаторов символа все columns одной записью.
+    Возвращает статус: "missing_data" | "ready" | "written".
+    """
+    market_df = ensure_market_history(symbol, start)
+    if market_df is None or market_df.empty:
+        return "missing_data"
+
+    ind_df = load_indicator(symbol)
+    if ind_df is not None and len(ind_df) == len(market_df) and all(c in ind_df.columns for c in columns):
+        return "ready"
+
+    sync_indicators(symbol, market_df, columns)
+    return "written"
+
+
+def warm_indicator_bank(signals, columns) -> dict[str, int]:
+    """
+    Прогрев банка индикаторов: для всех символов сигналов считает все колонки
+    пространства поиска заранее, чтобы трайлы только читали файлы.
+    """
+    stats = {"missing_data": 0, "ready": 0, "written": 0}
+    for symbol, start in signal_symbol_starts(signals).items():
+        try:
+            stats[warm_symbol(symbol, start, columns)] += 1
+        except Exception as e:
+            logging.warning(f"Indicator bank: {symbol} failed: {e}")
+            stats["missing_data"] += 1
+    return stats
@@ -1,12 +1,12 @@
+import numpy as np
 import pandas as pd
-import ta
+
+from loader.indicator_kernels import ema_many_from, rsi_many_from
 
 
 def calculate_indicators(df: pd.DataFrame, indicator_config: dict) -> pd.DataFrame:
-    indicators = pd.DataFrame({"datetime": df["datetime"]})
+    cols = []
 
-    close = df["close"].astype(float)
-    
     # ===== EMA spread (EMA_fast - EMA_slow) =====
     ema_cfg = indicator_config.get("ema")
     if ema_cfg and len(ema_cfg) >= 4 and ema_cfg[0]:
@@ -17,9 +17,9 @@ def calculate_indicators(df: pd.DataFrame, indicator_config: dict) -> pd.DataFra
         fast = int(fast)
         slow = int(slow)
         # считаем обе EMA, храним отдельно
-        indicators[f"ema_{fast}"] = close.ewm(span=fast, adjust=False).mean()
+        cols.append(f"ema_{fast}")
         if slow != fast:
-            indicators[f"ema_{slow}"] = close.ewm(span=slow, adjust=False).mean()
+            cols.append(f"ema_{slow}")
 
     # ===== RSI =====
     rsi_cfg = indicator_config.get("rsi")
@@ -27,11 +27,88 @@ def calculate_indicators(df: pd.DataFrame, indicator_config: dict) -> pd.DataFra
         _, _, _, period = rsi_cfg
         if period is None:
             raise ValueError("RSI включен, но period не задан")
-        indicators[f"rsi_{int(period)}"] = ta.momentum.RSIIndicator(close, int(period)).rsi()
+        cols.append(f"rsi_{int(period)}")
 
     # # ===== VOLUME =====
     # volume_cfg = indicator_config.get("volume")
     # if volume_cfg and volume_cfg[0]:
     #     indicators["volume_ma"] = df["volume"].rolling(20).mean()
 
-    return indicators
+    return calculate_columns(df, cols)
+
+
+def calculate_columns(df: pd.DataFrame, columns) -> pd.DataFrame:
+    """
+    Колонки индикаторов по именам (ema_<span>, rsi_<period>): все периоды
+    одного индикатора считаются numba-ядром за один проход по close.
+    """
+    return calculate_columns_state(df, columns)[0]
+
+
+def calculate_columns_state(df: pd.DataFrame, columns, state: dict | None = None):
+    """
+    Как calculate_columns, но с терминальным состоянием каждой колонки.
+    state: {col: состояние} после предыдущего бара ряда — тогда df содержит только
+    новые бары, и ряд продолжается за O(len(df)). Возвращает (frame, новое state).
+    """
+    periods = {"ema": [], "rsi": []}
+    for col in columns:
+        name, _, period = col.partition("_")
+        if name not in periods:
+            raise ValueError(f"Unknown indicator column: {col}")
+        periods[name].append(int(period))
+
+    state = state or {}
+    new_state = {}
+
+    indicators = pd.DataFrame({"datetime": df["datetime"]})
+    close = np.ascontiguousarray(df["close"].to_numpy(dtype=np.float64))
+
+    if periods["ema"]:
+        cols = [f"ema_{p}" for p in periods["ema"]]
+        prev = [state.get(c) for c in cols]
+        if state and not all(prev):
+            raise KeyError(f"Indicator state missing: {[c for c, st in zip(cols, prev) if not st]}")
+        if state:
+            weighted = np.array([st["weighted"] for st in prev], dtype=np.float64)
+            old_wt = np.array([st["old_wt"] for st in prev], dtype=np.float64)
+            nobs = int(prev[0]["nobs"])
+        else:
+            weighted = np.full(len(cols), np.nan, dtype=np.float64)
+            old_wt = np.ones(len(cols), dtype=np.float64)
+            nobs = 0
+
+        values, nobs = ema_many_from(close, np.array(periods["ema"], dtype=np.int64), weighted, old_wt, nobs)
+        for j, col in enumerate(cols):
+            indicators[col] = values[:, j]
+            new_state[col] = {"weighted": float(weighted[j]), "old_wt": float(old_wt[j]), "nobs": int(nobs)}
+
+    if periods["rsi"]:
+        cols = [f"rsi_{p}" for p in periods["rsi"]]
+        prev = [state.get(c) for c in cols]
+        if state and not all(prev):
+            raise KeyError(f"Indicator state missing: {[c for c, st in zip(cols, prev) if not st]}")
+        if state:
+            avg_up = np.array([st["avg_up"] for st in prev], dtype=np.float64)
+            avg_dn = np.array([st["avg_dn"] for st in prev], dtype=np.float64)
+            prev_close = float(prev[0]["prev_close"])
+            count = int(prev[0]["count"])
+        else:
+            avg_up = np.zeros(len(cols), dtype=np.float64)
+            avg_dn = np.zeros(len(cols), dtype=np.float64)
+            prev_close = np.nan
+            count = 0
+
+        values, prev_close, count = rsi_many_from(
+            close, np.array(periods["rsi"], dtype=np.int64), avg_up, avg_dn, prev_close, count
+        )
+        for j, col in enumerate(cols):
+            indicators[col] = values[:, j]
+            new_state[col] = {
+                "avg_up": float(avg_up[j]),
+                "avg_dn": float(avg_dn[j]),
+                "prev_close": float(prev_close),
+                "count": int(count),
+            }
+
+    return indicators, new_state
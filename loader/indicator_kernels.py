@@ -0,0 +1,202 @@
+import numba as nb
+import numpy as np
+
+# =====================
+# Много периодов за один проход по барам.
+# Семантика повторяет pandas/ta:
+#   ema  — close.ewm(span, adjust=False).mean()
+#   rsi  — ta.momentum.RSIIndicator(close, period).rsi() (Wilder, ewm alpha=1/period, min_periods=period)
+#   rsi_sma — rolling(period).mean() роста/падения close (loader/indicators.py)
+#   atr  — rolling(window).mean() от true range (loader/indicators.py)
+# =====================
+
+@nb.njit(cache=True)
+def ema_many_from(close, spans, weighted, old_wt, nobs):
+    """
+    Продолжение EMA с сохранённого состояния (weighted/old_wt по span, nobs — общий).
+    weighted/old_wt обновляются на месте; возвращает (out (n, k), nobs).
+    Начальное состояние ряда: weighted=NaN, old_wt=1, nobs=0.
+    """
+    n = close.shape[0]
+    k = spans.shape[0]
+    out = np.empty((n, k), dtype=np.float64)
+
+    alpha = np.empty(k, dtype=np.float64)
+    for j in range(k):
+        alpha[j] = 2.0 / (spans[j] + 1.0)
+
+    for i in range(n):
+        cur = close[i]
+        is_obs = cur == cur
+        if is_obs:
+            nobs += 1
+        for j in range(k):
+            w = weighted[j]
+            if w == w:
+                old_wt[j] *= 1.0 - alpha[j]
+                if is_obs:
+                    if w != cur:
+                        w = (old_wt[j] * w + alpha[j] * cur) / (old_wt[j] + alpha[j])
+                    old_wt[j] = 1.0
+            elif is_obs:
+                w = cur
+            weighted[j] = w
+            out[i, j] = w if nobs >= 1 else np.nan
+
+    return out, nobs
+
+@nb.njit(cache=True)
+def ema_many(close, spans):
+    """(n, len(spans)): EMA по каждому span, как ewm(adjust=False, ignore_na=False)."""
+    k = spans.shape[0]
+    weighted = np.full(k, np.nan, dtype=np.float64)
+    old_wt = np.ones(k, dtype=np.float64)
+    out, _ = ema_many_from(close, spans, weighted, old_wt, 0)
+    return out
+
+@nb.njit(cache=True)
+def rsi_many_from(close, periods, avg_up, avg_dn, prev_close, count):
+    """
+    Продолжение RSI с сохранённого состояния: avg_up/avg_dn по периоду (на месте),
+    prev_close и count (сколько баров ряда уже обработано) — общие.
+    Возвращает (out (n, k), prev_close, count). Начальное состояние: нули, count=0.
+    """
+    n = close.shape[0]
+    k = periods.shape[0]
+    out = np.empty((n, k), dtype=np.float64)
+
+    alpha = np.empty(k, dtype=np.float64)
+    for j in range(k):
+        alpha[j] = 1.0 / periods[j]
+
+    for i in range(n):
+        # первый бар ряда: diff = NaN -> up = down = 0 (where(diff > 0, diff, 0.0))
+        up = 0.0
+        dn = 0.0
+        if count > 0:
+            d = close[i] - prev_close
+            if d > 0:
+                up = d
+            elif d < 0:
+                dn = -d
+
+        for j in range(k):
+            if count > 0:
+                a = alpha[j]
+                # ewm(adjust=False): веса (1-a) и a, наблюдения никогда не NaN
+                u = avg_up[j]
+                if u != up:
+                    u = ((1.0 - a) * u + a * up) / ((1.0 - a) + a)
+                avg_up[j] = u
+                v = avg_dn[j]
+                if v != dn:
+                    v = ((1.0 - a) * v + a * dn) / ((1.0 - a) + a)
+                avg_dn[j] = v
+
+            if count + 1 < periods[j]:
+                out[i, j] = np.nan
+            elif avg_dn[j] == 0:
+                out[i, j] = 100.0
+            else:
+                out[i, j] = 100.0 - 100.0 / (1.0 + avg_up[j] / avg_dn[j])
+
+        prev_close = close[i]
+        count += 1
+
+    return out, prev_close, count
+
+@nb.njit(cache=True)
+def rsi_many(close, periods):
+    """(n, len(periods)): RSI Уайлдера, как ta.momentum.RSIIndicator(close, period).rsi()."""
+    k = periods.shape[0]
+    avg_up = np.zeros(k, dtype=np.float64)
+    avg_dn = np.zeros(k, dtype=np.float64)
+    out, _, _ = rsi_many_from(close, periods, avg_up, avg_dn, np.nan, 0)
+    return out
+
+@nb.njit(cache=True)
+def rsi_sma_many(close, periods):
+    """(n, len(periods)): RSI на rolling(period).mean() роста/падения, как в loader/indicators.py."""
+    n = close.shape[0]
+    k = periods.shape[0]
+    out = np.empty((n, k), dtype=np.float64)
+
+    # рост/падение по diff; первый бар и NaN в close дают NaN (clip его сохраняет)
+    up = np.empty(n, dtype=np.float64)
+    dn = np.empty(n, dtype=np.float64)
+    for i in range(n):
+        d = close[i] - close[i - 1] if i > 0 else np.nan
+        if d == d:
+            up[i] = d if d > 0 else 0.0
+            dn[i] = -d if d < 0 else 0.0
+        else:
+            up[i] = np.nan
+            dn[i] = np.nan
+
+    for j in range(k):
+        p = periods[j]
+        # окно скользит: сумма и число NaN внутри окна
+        s_up = 0.0
+        s_dn = 0.0
+        bad = 0
+        for i in range(n):
+            if up[i] == up[i]:
+                s_up += up[i]
+                s_dn += dn[i]
+            else:
+                bad += 1
+            if i >= p:
+                if up[i - p] == up[i - p]:
+                    s_up -= up[i - p]
+                    s_dn -= dn[i - p]
+                else:
+                    bad -= 1
+            if i + 1 < p or bad > 0:
+                out[i, j] = np.nan
+            else:
+                # rolling mean: неотрицательные суммы не уходят ниже нуля от ошибок округления
+                g = max(s_up, 0.0) / p
+                l = max(s_dn, 0.0) / p
+                if l == 0:
+                    out[i, j] = 100.0 if g > 0 else np.nan
+                else:
+                    out[i, j] = 100.0 - 100.0 / (1.0 + g / l)
+
+    return out
+
+@nb.njit(cache=True)
+def atr_many(high, low, close, windows):
+    """(n, len(windows)): rolling(window).mean() от true range."""
+    n = close.shape[0]
+    k = windows.shape[0]
+    out = np.empty((n, k), dtype=np.float64)
+
+    # префиксные суммы TR и число NaN — любое окно за O(1)
+    csum = np.zeros(n + 1, dtype=np.float64)
+    cnan = np.zeros(n + 1, dtype=np.int64)
+    for i in range(n):
+        tr = high[i] - low[i]
+        if i > 0:
+            hc = abs(high[i] - close[i - 1])
+            lc = abs(low[i] - close[i - 1])
+            # max(axis=1) пропускает NaN
+            if tr != tr or (hc == hc and hc > tr):
+                tr = hc
+            if tr != tr or (lc == lc and lc > tr):
+                tr = lc
+        if tr == tr:
+            csum[i + 1] = csum[i] + tr
+            cnan[i + 1] = cnan[i]
+        else:
+            csum[i + 1] = csum[i]
+            cnan[i + 1] = cnan[i] + 1
+
+    for j in range(k):
+        w = windows[j]
+        for i in range(n):
+            if i + 1 < w or cnan[i + 1] - cnan[i + 1 - w] > 0:
+                out[i, j] = np.nan
+            else:
+                out[i, j] = (csum[i + 1] - csum[i + 1 - w]) / w
+
+    return out
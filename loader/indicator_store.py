@@ -1,24 +1,85 @@
-from functools import lru_cache
+import json
 from pathlib import Path
+import numpy as np
 import pandas as pd
 
+from loader.cache import cached
+from loader.indicator_calc import calculate_columns_state
+from loader.market_loader import bars_hash, frame_to_bars, market_stamp
+
 INDICATOR_PATH = Path("data/indicators")
 INDICATOR_PATH.mkdir(parents=True, exist_ok=True)
 
+# терминальное состояние индикаторов хранится в метаданных того же parquet
+STATE_KEY = b"hypertrade.indicator_state"
+
 def _indicator_file(symbol: str) -> Path:
     return INDICATOR_PATH / f"{symbol}.parquet"
 
-@lru_cache(maxsize=2048)
+@cached
 def _read_indicator(path_str: str, mtime_ns: int) -> pd.DataFrame:
     return pd.read_parquet(path_str, engine="pyarrow")
 
+@cached
+def _read_indicator_schema(path_str: str, mtime_ns: int) -> tuple[tuple[str, ...], dict | None]:
+    import pyarrow.parquet as pq
+
+    schema = pq.read_schema(path_str)
+    raw = (schema.metadata or {}).get(STATE_KEY)
+    return tuple(schema.names), (json.loads(raw) if raw else None)
+
+@cached
+def _read_indicator_column(path_str: str, mtime_ns: int, column: str) -> np.ndarray:
+    import pyarrow.parquet as pq
+
+    # проекция: с диска читается и распаковывается только эта колонка
+    values = pq.read_table(path_str, columns=[column]).column(column).to_numpy()
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    values.flags.writeable = False
+    return values
+
 def load_indicator(symbol: str) -> pd.DataFrame | None:
     path = _indicator_file(symbol)
     if not path.exists():
         return None
     return _read_indicator(str(path), path.stat().st_mtime_ns)
 
-def save_indicator(symbol: str, df: pd.DataFrame):
+def load_indicator_state(symbol: str) -> dict | None:
+    """{"rows", "last_ns", "bars_hash", "columns": {col: состояние}} последнего сохранения либо None."""
+    path = _indicator_file(symbol)
+    if not path.exists():
+        return None
+    return _read_indicator_schema(str(path), path.stat().st_mtime_ns)[1]
+
+def load_aligned_columns(symbol: str, columns) -> dict[str, np.ndarray] | None:
+    """
+    Колонки индикаторов построчно к OHLC-файлу символа (без join по datetime).
+    None — файла нет, в нём нет какой-то колонки или он не выровнен
+    с текущим OHLC (число строк/bars_hash из метаданных не совпали).
+    """
+    path = _indicator_file(symbol)
+    stamp = market_stamp(symbol)
+    if stamp is None or not path.exists():
+        return None
+    path_str, mtime_ns = str(path), path.stat().st_mtime_ns
+
+    names, meta = _read_indicator_schema(path_str, mtime_ns)
+    if not meta or (meta.get("rows"), meta.get("bars_hash")) != stamp:
+        return None
+    if any(col not in names for col in columns):
+        return None
+    return {col: _read_indicator_column(path_str, mtime_ns, col) for col in columns}
+
+def save_indicator(symbol: str, df: pd.DataFrame, state: dict | None = None, source: pd.DataFrame | None = None):
+    """
+    state: {col: терминальное состояние} по последней строке df (calculate_columns_state).
+    source: бары, на которых посчитан df (строка в строку); в метаданные пишется их bars_hash —
+    по нему load_aligned_columns проверяет выравнивание с OHLC-файлом, а sync_indicators —
+    что сохранённые строки не пересмотрены перед продлением по состоянию.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
     if df is None or df.empty:
         return
     path = _indicator_file(symbol)
@@ -28,4 +89,82 @@ def save_indicator(symbol: str, df: pd.DataFrame):
     out.reset_index(drop=True, inplace=True)
 
     cols = ["datetime"] + [col for col in out.columns if col not in ("timestamp", "datetime")]
-    out[cols].to_parquet(path, engine="pyarrow", compression="zstd")
+    table = pa.Table.from_pandas(out[cols], preserve_index=False)
+
+    dt_ns = out["datetime"].values.astype("datetime64[ns]").astype(np.int64)
+    meta = dict(table.schema.metadata or {})
+    meta[STATE_KEY] = json.dumps({
+        "rows": int(len(out)),
+        "last_ns": int(dt_ns[-1]),
+        "bars_hash": bars_hash(*frame_to_bars(source)) if source is not None and len(source) == len(out) else None,
+        "columns": {c: st for c, st in (state or {}).items() if c in out.columns},
+    }).encode()
+    table = table.replace_schema_metadata(meta)
+
+    pq.write_table(table, path, compression="zstd")
+
+def _is_prefix(ind_df: pd.DataFrame, market_df: pd.DataFrame, saved: dict) -> bool:
+    """
+    Сохранённые строки — начало market_df с теми же барами: сверка bars_hash по всем n строкам,
+    а не только крайних datetime (merge_market с keep="last" пересматривает бар без смены datetime).
+    Нет хэша (старый файл) — False, т.е. полный пересчёт.
+    """
+    n = len(ind_df)
+    if n == 0 or n > len(market_df) or saved.get("rows") != n or not saved.get("bars_hash"):
+        return False
+    return saved["bars_hash"] == bars_hash(*frame_to_bars(market_df.iloc[:n]))
+
+def sync_indicators(symbol: str, market_df: pd.DataFrame, columns, persist: bool = True) -> pd.DataFrame:
+    """
+    Индикаторы символа на всех барах market_df: колонки columns + всё, что уже было в файле.
+      - файла нет или история изменилась не только в хвосте — полный расчёт;
+      - в хвост истории добавились бары — продление по сохранённому состоянию за O(новых баров);
+      - не хватает колонок — досчёт только их.
+    persist=False — ничего не пишет на диск.
+    """
+    ind_df = load_indicator(symbol)
+    saved = load_indicator_state(symbol) or {}
+
+    if ind_df is None or ind_df.empty or not _is_prefix(ind_df, market_df, saved):
+        have = set(ind_df.columns) - {"datetime"} if ind_df is not None else set()
+        ind_df, state = calculate_columns_state(market_df, sorted(have | set(columns)))
+        if persist:
+            save_indicator(symbol, ind_df, state, source=market_df)
+        return ind_df
+
+    n_old = len(ind_df)
+    have = [c for c in ind_df.columns if c != "datetime"]
+    saved_cols = saved.get("columns", {}) if saved.get("rows") == n_old else {}
+    state = {c: saved_cols[c] for c in have if c in saved_cols}
+    changed = False
+
+    if n_old < len(market_df):
+        tail = market_df.iloc[n_old:]
+        stateful = [c for c in have if c in state]
+        stateless = [c for c in have if c not in state]
+
+        ext, ext_state = calculate_columns_state(tail, stateful, {c: state[c] for c in stateful})
+        parts = [ind_df[["datetime"] + stateful], ext[["datetime"] + stateful]]
+        ind_df = pd.concat(parts, ignore_index=True)
+        state.update(ext_state)
+
+        # колонки без сохранённого состояния — полный пересчёт
+        if stateless:
+            full, full_state = calculate_columns_state(market_df, stateless)
+            for col in stateless:
+                ind_df[col] = full[col].values
+            state.update(full_state)
+        changed = True
+
+    missing = [c for c in columns if c not in ind_df.columns]
+    if missing:
+        new_df, new_state = calculate_columns_state(market_df, missing)
+        ind_df = ind_df.copy() if not changed else ind_df
+        for col in missing:
+            ind_df[col] = new_df[col].values
+        state.update(new_state)
+        changed = True
+
+    if changed and persist:
+        save_indicator(symbol, ind_df, state, source=market_df)
+    return ind_df
@@ -1,32 +1,32 @@
+import numpy as np
 import pandas as pd
-import ta
+
+from loader.indicator_kernels import ema_many, rsi_sma_many, atr_many
+
+def _f64(df: pd.DataFrame, col: str) -> np.ndarray:
+    return np.ascontiguousarray(df[col].to_numpy(dtype=np.float64))
 
 def add_indicators(df: pd.DataFrame, config: dict) -> pd.DataFrame:
     df = df.copy()
 
     for name, periods in config.items():
-        for p in periods:
-            col = f"{name}_{p}"
-
-            if col in df.columns:
-                continue
-
-            if name == "ema":
-                df[col] = df["close"].ewm(span=p, adjust=False).mean()
-
-            elif name == "rsi":
-                delta = df["close"].diff()
-                gain = delta.clip(lower=0)
-                loss = -delta.clip(upper=0)
-                rs = gain.rolling(p).mean() / loss.rolling(p).mean()
-                df[col] = 100 - (100 / (1 + rs))
-
-            elif name == "atr":
-                high_low = df["high"] - df["low"]
-                high_close = (df["high"] - df["close"].shift()).abs()
-                low_close = (df["low"] - df["close"].shift()).abs()
-                tr = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-                df[col] = tr.rolling(p).mean()
+        # недостающие периоды индикатора — одним вызовом ядра (все периоды за проход)
+        todo = [p for p in dict.fromkeys(periods) if f"{name}_{p}" not in df.columns]
+        if not todo:
+            continue
+        arr = np.array(todo, dtype=np.int64)
+
+        if name == "ema":
+            out = ema_many(_f64(df, "close"), arr)
+        elif name == "rsi":
+            out = rsi_sma_many(_f64(df, "close"), arr)
+        elif name == "atr":
+            out = atr_many(_f64(df, "high"), _f64(df, "low"), _f64(df, "close"), arr)
+        else:
+            continue
+
+        for j, p in enumerate(todo):
+            df[f"{name}_{p}"] = out[:, j]
 
     return df
     # df["ema_fast"] = ta.trend.ema_indicator(df["close"], window=20)
@@ -0,0 +1,106 @@
+import argparse
+import atexit
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from loader.api_client import search_symbol
+from loader.json_store import JsonStore
+
+INSTRUMENT_MAP_PATH = Path("data/instruments.json")
+
+# "не найден на USA рынках" перепроверяется не чаще раза в неделю
+NOT_FOUND_TTL = 7 * 24 * 3600
+
+# symbol -> {"instrument": {symbol, source} | None, "checked_at": unix time}
+_store = JsonStore(INSTRUMENT_MAP_PATH, indent=1)
+
+
+def flush() -> int:
+    """Пишет найденное за прогон одним разом (с merge поверх карты других процессов)."""
+    return _store.flush()
+
+
+# страховка для путей без явного flush (resolve_instrument из бэктеста)
+atexit.register(flush)
+
+
+def _is_fresh(entry: dict | None, now: float) -> bool:
+    if entry is None:
+        return False
+    if entry.get("instrument") is not None:
+        return True
+    return now - entry.get("checked_at", 0) < NOT_FOUND_TTL
+
+
+def lookup(symbol: str) -> tuple[bool, dict | None]:
+    """(известен ли ответ, instrument | None) без обращения к API."""
+    entry = _store.get(symbol)
+    if not _is_fresh(entry, time.time()):
+        return False, None
+    return True, entry["instrument"]
+
+
+def record(symbol: str, instrument: dict | None, persist: bool = False):
+    """persist=False — запись уйдёт на диск со следующим flush."""
+    _store.set(symbol, {"instrument": instrument, "checked_at": time.time()})
+    if persist:
+        flush()
+
+
+def resolve_instrument(symbol: str) -> dict | None:
+    """
+    instrument {symbol, source} для USA рынков: сначала карта на диске,
+    search_symbol — только для неизвестных символов и просроченных "не найден".
+    На диск ответ попадает с flush (конец prefetch/refresh_instruments или выход процесса).
+    """
+    known, instrument = lookup(symbol)
+    if known:
+        return instrument
+    instrument = search_symbol(symbol)
+    record(symbol, instrument)
+    return instrument
+
+
+def refresh_instruments(symbols, workers: int = 8, force: bool = False) -> dict:
+    """Массовое обновление: неизвестные и просроченные символы (force — все), одна запись карты в конце."""
+    now = time.time()
+    current = _store.load()
+    todo = [s for s in dict.fromkeys(symbols) if force or not _is_fresh(current.get(s), now)]
+
+    stats = {"symbols": len(set(symbols)), "checked": 0, "found": 0, "not_found": 0, "failed": 0}
+    with ThreadPoolExecutor(max_workers=max(1, int(workers))) as pool:
+        futures = {pool.submit(search_symbol, symbol): symbol for symbol in todo}
+        for fut in as_completed(futures):
+            symbol = futures[fut]
+            try:
+                instrument = fut.result()
+            except Exception as e:
+                logging.warning(f"Instrument map: {symbol} failed: {e}")
+                stats["failed"] += 1
+                continue
+            record(symbol, instrument)
+            stats["checked"] += 1
+            stats["found" if instrument is not None else "not_found"] += 1
+
+    flush()
+    return stats
+
+
+if __name__ == "__main__":
+    from loader.indicator_bank import signal_symbol_starts
+    from loader.signals import load_signals
+
+    parser = argparse.ArgumentParser(description="Обновление карты инструментов (symbol -> source)")
+    parser.add_argument("--signals", type=str, default="data/signals/signals.csv")
+    parser.add_argument("--symbols", type=str, default=None, help="список через запятую вместо файла сигналов")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--force", action="store_true", help="перепроверить и уже известные символы")
+    args = parser.parse_args()
+
+    if args.symbols:
+        symbols = [s.strip() for s in args.symbols.split(",") if s.strip()]
+    else:
+        symbols = list(signal_symbol_starts(load_signals(args.signals)))
+    print(f"Instrument map: {refresh_instruments(symbols, workers=args.workers, force=args.force)}")
@@ -0,0 +1,108 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+_DELETED = object()
+
+
+class JsonStore:
+    """
+    JSON-словарь на диске (key -> запись), общий для потоков и процессов.
+    Изменения копятся в памяти и пишутся одним flush; запись — под flock,
+    поверх текущего файла (только изменённые ключи), так что процессы не затирают друг друга.
+    """
+
+    def __init__(self, path: Path, indent: int | None = None):
+        self.path = Path(path)
+        self.indent = indent
+        self._lock = threading.RLock()
+        self._data = None
+        self._mtime = None
+        self._pending = {}   # key -> запись | _DELETED, ещё не записанные
+
+    def _read_file(self) -> dict:
+        return json.loads(self.path.read_text()) if self.path.exists() else {}
+
+    def load(self) -> dict:
+        """Словарь с диска (перечитывается, если файл поменял другой процесс) + незаписанные изменения."""
+        with self._lock:
+            mtime = self.path.stat().st_mtime_ns if self.path.exists() else None
+            if self._data is None or mtime != self._mtime:
+                self._data = self._read_file()
+                self._mtime = mtime
+                self._apply(self._data, self._pending)
+            return self._data
+
+    @staticmethod
+    def _apply(data: dict, changes: dict):
+        for key, value in changes.items():
+            if value is _DELETED:
+                data.pop(key, None)
+            else:
+                data[key] = value
+
+    def get(self, key):
+        with self._lock:
+            return self.load().get(key)
+
+    def set(self, key, value):
+        with self._lock:
+            self.load()[key] = value
+            self._pending[key] = value
+
+    def update(self, key, **fields):
+        """Обновляет поля записи (остальные сохраняются)."""
+        with self._lock:
+            entry = self.load().setdefault(key, {})
+            entry.update(fields)
+            self._pending[key] = entry
+
+    def pop(self, key):
+        with self._lock:
+            value = self.load().pop(key, None)
+            if value is not None:
+                self._pending[key] = _DELETED
+            return value
+
+    @contextmanager
+    def _file_lock(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_name(f".{self.path.name}.lock"), "w") as fh:
+            try:
+                import fcntl
+                fcntl.flock(fh, fcntl.LOCK_EX)
+            except ImportError:
+                pass
+            yield
+
+    def _write(self, data: dict):
+        tmp = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(data, indent=self.indent, sort_keys=True))
+        # атомарная замена: читатели видят либо старый, либо новый файл целиком
+        os.replace(tmp, self.path)
+        self._data = data
+        self._mtime = self.path.stat().st_mtime_ns
+
+    def flush(self) -> int:
+        """Пишет накопленные изменения поверх текущего файла; возвращает число ключей."""
+        with self._lock:
+            if not self._pending:
+                return 0
+            with self._file_lock():
+                data = self._read_file()
+                self._apply(data, self._pending)
+                self._write(data)
+            n = len(self._pending)
+            self._pending = {}
+            return n
+
+    def replace(self, data: dict):
+        """Записывает словарь целиком (полная пересборка)."""
+        with self._lock, self._file_lock():
+            self._pending = {}
+            self._write(dict(data))
+
+    def dirty(self) -> bool:
+        return bool(self._pending)
@@ -0,0 +1,147 @@
+import argparse
+import atexit
+import hashlib
+import io
+from pathlib import Path
+
+import pandas as pd
+
+from loader.json_store import JsonStore
+
+# индекс хранилища OHLC (один файл рядом с parquet):
+# {symbol: {min_ns, max_ns, rows, mtime_ns, hash, synced_ns, api_earliest_ns}}
+STORE_PATH = Path("data/ohlc")
+INDEX_PATH = STORE_PATH / "_index.json"
+
+# изменения копятся в памяти и пишутся одним flush (конец prefetch/convert или выход процесса)
+_store = JsonStore(INDEX_PATH)
+
+
+def flush() -> int:
+    """Пишет изменённые записи поверх индекса на диске (под flock, записи других процессов сохраняются)."""
+    return _store.flush()
+
+
+atexit.register(flush)
+
+
+def get(symbol: str) -> dict | None:
+    entry = _store.get(symbol)
+    return dict(entry) if entry is not None else None
+
+
+def file_hash(path: Path) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class HashingFile(io.RawIOBase):
+    """Файл на запись, который считает file_hash по ходу записи — без повторного чтения файла."""
+
+    def __init__(self, path: Path):
+        super().__init__()
+        self._f = open(path, "wb")
+        self._h = hashlib.blake2b(digest_size=16)
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._h.update(b)
+        return self._f.write(b)
+
+    def close(self):
+        if not self.closed:
+            self._f.close()
+        super().close()
+
+    def hexdigest(self) -> str:
+        return self._h.hexdigest()
+
+
+def _scan_file(path: Path, digest: str | None = None) -> dict:
+    """
+    Запись индекса по футеру parquet: строки и min/max datetime из статистик row group.
+    digest — уже посчитанный при записи hash (HashingFile), иначе файл читается целиком.
+    """
+    import pyarrow.parquet as pq
+
+    meta = pq.ParquetFile(path).metadata
+    col = meta.schema.names.index("datetime")
+    lo = hi = None
+    for i in range(meta.num_row_groups):
+        stats = meta.row_group(i).column(col).statistics
+        if stats is None or not stats.has_min_max:
+            lo = hi = None
+            break
+        g_lo, g_hi = pd.Timestamp(stats.min).value, pd.Timestamp(stats.max).value
+        lo = g_lo if lo is None else min(lo, g_lo)
+        hi = g_hi if hi is None else max(hi, g_hi)
+
+    if lo is None and meta.num_rows:
+        # статистик нет — читаем одну колонку
+        dt = pq.read_table(path, columns=["datetime"]).column("datetime").to_pandas()
+        lo, hi = pd.Timestamp(dt.min()).value, pd.Timestamp(dt.max()).value
+
+    return {
+        "min_ns": int(lo) if lo is not None else None,
+        "max_ns": int(hi) if hi is not None else None,
+        "rows": int(meta.num_rows),
+        "mtime_ns": path.stat().st_mtime_ns,
+        "hash": digest if digest is not None else file_hash(path),
+    }
+
+
+def refresh(symbol: str, path: Path | None = None, digest: str | None = None) -> dict | None:
+    """Перечитывает запись символа с диска (после записи файла в обход save_market); на диск — с flush."""
+    path = path or STORE_PATH / f"{symbol}.parquet"
+    if not path.exists():
+        _store.pop(symbol)
+        return None
+    update(symbol, **_scan_file(path, digest))
+    return get(symbol)
+
+
+def coverage(symbol: str) -> dict | None:
+    """
+    Запись индекса, сверенная с mtime файла (один stat, без чтения данных).
+    Если файл менялся в обход индекса — запись обновляется по футеру parquet.
+    """
+    path = STORE_PATH / f"{symbol}.parquet"
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    entry = get(symbol)
+    if entry is None or entry.get("mtime_ns") != mtime_ns or "rows" not in entry:
+        entry = refresh(symbol, path)
+    return entry
+
+
+def rebuild() -> dict:
+    """Полная пересборка индекса по футерам всех parquet хранилища; поля синхронизации с API сохраняются."""
+    old = _store.load()
+    new = {}
+    for path in sorted(STORE_PATH.glob("*.parquet")):
+        entry = {k: v for k, v in old.get(path.stem, {}).items() if k in ("synced_ns", "api_earliest_ns")}
+        entry.update(_scan_file(path))
+        new[path.stem] = entry
+    _store.replace(new)
+    return dict(new)
+
+
+def update(symbol: str, **fields):
+    """Обновляет поля записи символа (остальные сохраняются); на диск — с flush."""
+    _store.update(symbol, **fields)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Индекс покрытия хранилища OHLC")
+    parser.add_argument("--rebuild", action="store_true", help="пересобрать по футерам parquet")
+    args = parser.parse_args()
+
+    index = rebuild() if args.rebuild else _store.load()
+    print(f"{len(index)} symbols in {INDEX_PATH}")
@@ -1,12 +1,43 @@
+import hashlib
+import math
+import os
+import threading
 from pathlib import Path
-from functools import lru_cache
+import numpy as np
 import pandas as pd
 from loader.api_client import fetch_market_data
+from loader.cache import LOADER_CACHE, cached
+from loader import bar_store, market_index, panel_store
 
 MARKET_PATH = Path("data/ohlc")
 MARKET_PATH.mkdir(parents=True, exist_ok=True)
 
-@lru_cache(maxsize=2048)
+BAR_MINUTES = 15
+# первая загрузка символа — не меньше стольких баров (как раньше)
+DEFAULT_LIMIT = 15000
+# запас на бары, появившиеся пока идёт запрос
+TAIL_MARGIN = 16
+# больше API за раз не отдаёт (и больше не запрашивалось никогда): limit режется до него
+API_MAX_LIMIT = int(os.getenv("HYPERTRADE_API_MAX_LIMIT", "20000"))
+
+# формат файлов OHLC: кодек (zstd | lz4 | snappy | none) и размер row group в барах;
+# row group упорядочены по времени и несут min/max datetime — оконные чтения пропускают лишние
+OHLC_CODEC = os.getenv("HYPERTRADE_OHLC_CODEC", "zstd")
+OHLC_ROW_GROUP = int(os.getenv("HYPERTRADE_OHLC_ROW_GROUP", "8192"))
+
+def write_market_parquet(df: pd.DataFrame, path, codec: str | None = None, row_group_size: int | None = None):
+    """df уже отсортирован по datetime."""
+    codec = OHLC_CODEC if codec is None else codec
+    df.to_parquet(
+        path,
+        engine="pyarrow",
+        compression=None if codec == "none" else codec,
+        row_group_size=OHLC_ROW_GROUP if row_group_size is None else int(row_group_size),
+        write_statistics=True,
+        index=False,
+    )
+
+@cached
 def _read_market(path_str: str, mtime_ns: int) -> pd.DataFrame:
     return pd.read_parquet(path_str, engine="pyarrow")
 
@@ -16,31 +47,259 @@ def load_market(symbol: str) -> pd.DataFrame | None:
         return None
     return _read_market(str(path), path.stat().st_mtime_ns)
 
+def frame_to_bars(df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    """(dt_ns int64, ohlc float64 (n,4)) из DataFrame с datetime/open/high/low/close."""
+    dt_ns = np.ascontiguousarray(df["datetime"].values.astype("datetime64[ns]").astype(np.int64))
+    ohlc = np.ascontiguousarray(df[["open", "high", "low", "close"]].to_numpy(dtype=np.float64))
+    return dt_ns, ohlc
+
+@cached
+def _read_market_window(path_str: str, mtime_ns: int, start_ns: int | None, end_ns: int | None) -> tuple[pd.DataFrame, int]:
+    import pyarrow.parquet as pq
+    pf = pq.ParquetFile(path_str)
+    meta = pf.metadata
+    col = pf.schema_arrow.get_field_index("datetime")
+    # row group упорядочены по времени: пропускаются ведущие (max < start) и хвостовые (min > end);
+    # смещение окна — сумма num_rows пропущенных ведущих групп
+    groups, offset = [], 0
+    for i in range(meta.num_row_groups):
+        rg = meta.row_group(i)
+        stats = rg.column(col).statistics
+        known = stats is not None and stats.has_min_max
+        if not groups and known and start_ns is not None and pd.Timestamp(stats.max).value < start_ns:
+            offset += rg.num_rows
+            continue
+        if known and end_ns is not None and pd.Timestamp(stats.min).value > end_ns:
+            break
+        groups.append(i)
+    table = pf.read_row_groups(groups) if groups else pf.schema_arrow.empty_table()
+    return table.to_pandas(), offset
+
+def load_market_window(symbol: str, start=None, end=None) -> tuple[pd.DataFrame, int] | None:
+    """
+    Бары символа по row group, пересекающим [start, end], без чтения всей истории.
+    Возвращает (df, row_offset): df.iloc[i] — строка row_offset + i полного файла
+    (по ней режутся построчно выровненные с OHLC колонки индикаторов). Границы — по группам,
+    так что df может начинаться раньше start и кончаться позже end.
+    """
+    path = MARKET_PATH / f"{symbol}.parquet"
+    if not path.exists():
+        return None
+    start_ns = _to_ns(start) if start is not None else None
+    end_ns = _to_ns(end) if end is not None else None
+    return _read_market_window(str(path), path.stat().st_mtime_ns, start_ns, end_ns)
+
+@cached
+def _read_market_window_bars(path_str: str, mtime_ns: int, start_ns: int | None, end_ns: int | None):
+    df, offset = _read_market_window(path_str, mtime_ns, start_ns, end_ns)
+    dt_ns, ohlc = frame_to_bars(df)
+    dt_ns.flags.writeable = False
+    ohlc.flags.writeable = False
+    return (dt_ns, ohlc), offset
+
+def load_market_bars_window(symbol: str, start=None, end=None):
+    """
+    ((dt_ns, ohlc), row_offset) — бары для симулятора начиная с row group, где есть start.
+    С npy/panel бары и так mmap — отдаются целиком со смещением 0; с parquet читается только окно.
+    """
+    if bar_store.BAR_BACKEND in ("npy", "panel"):
+        bars = load_market_bars(symbol)
+        return None if bars is None else (bars, 0)
+    path = MARKET_PATH / f"{symbol}.parquet"
+    if not path.exists():
+        return None
+    start_ns = _to_ns(start) if start is not None else None
+    end_ns = _to_ns(end) if end is not None else None
+    return _read_market_window_bars(str(path), path.stat().st_mtime_ns, start_ns, end_ns)
+
+@cached
+def _read_market_bars(path_str: str, mtime_ns: int) -> tuple[np.ndarray, np.ndarray]:
+    dt_ns, ohlc = frame_to_bars(_read_market(path_str, mtime_ns))
+    # массивы общие для всех сделок/трайлов — защищаем от случайной записи
+    dt_ns.flags.writeable = False
+    ohlc.flags.writeable = False
+    return dt_ns, ohlc
+
+def load_market_bars(symbol: str) -> tuple[np.ndarray, np.ndarray] | None:
+    """
+    Бары символа для симулятора: (dt_ns int64, ohlc float64 (n,4)), строки как в load_market.
+    HYPERTRADE_BAR_BACKEND=npy — read-only memmap из bar_store (общий page cache процессов),
+    panel — view в общую панель всех символов (panel_store); если выгрузка неактуальна —
+    из parquet, один раз на версию файла (mtime).
+    """
+    if bar_store.BAR_BACKEND == "npy":
+        bars = bar_store.load_bars(symbol)
+        if bars is not None:
+            return bars
+    elif bar_store.BAR_BACKEND == "panel":
+        bars = panel_store.load_bars(symbol)
+        if bars is not None:
+            return bars
+    return load_market_bars_parquet(symbol)
+
+def load_market_bars_parquet(symbol: str) -> tuple[np.ndarray, np.ndarray] | None:
+    path = MARKET_PATH / f"{symbol}.parquet"
+    if not path.exists():
+        return None
+    return _read_market_bars(str(path), path.stat().st_mtime_ns)
+
+def bars_hash(dt_ns: np.ndarray, ohlc: np.ndarray) -> str:
+    """
+    Отпечаток баров: ось datetime (int64 UTC ns) и high/low/close — всё, по чему считаются индикаторы.
+    Для проверки построчного выравнивания файлов: ловит и бар, пересмотренный API без смены datetime.
+    """
+    h = hashlib.blake2b(np.ascontiguousarray(dt_ns, dtype=np.int64).tobytes(), digest_size=16)
+    h.update(np.ascontiguousarray(np.asarray(ohlc)[:, 1:4], dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+@cached
+def _read_market_stamp(path_str: str, mtime_ns: int) -> tuple[int, str]:
+    # проекция колонок баров (без volume и прочего) — без кэширования всей истории
+    df = pd.read_parquet(path_str, engine="pyarrow", columns=["datetime", "open", "high", "low", "close"])
+    dt_ns, ohlc = frame_to_bars(df)
+    return int(dt_ns.shape[0]), bars_hash(dt_ns, ohlc)
+
+def market_stamp(symbol: str) -> tuple[int, str] | None:
+    """
+    (число строк, bars_hash) OHLC-файла символа. С npy/panel — из метаданных актуальной выгрузки
+    (без чтения parquet), иначе считается по parquet один раз на версию файла.
+    """
+    if bar_store.BAR_BACKEND == "npy":
+        stamp = bar_store.load_stamp(symbol)
+        if stamp is not None:
+            return stamp
+    elif bar_store.BAR_BACKEND == "panel":
+        stamp = panel_store.load_stamp(symbol)
+        if stamp is not None:
+            return stamp
+    path = MARKET_PATH / f"{symbol}.parquet"
+    if not path.exists():
+        return None
+    return _read_market_stamp(str(path), path.stat().st_mtime_ns)
+
 def save_market(symbol: str, df: pd.DataFrame):
     path = MARKET_PATH / f"{symbol}.parquet"
     out = df.copy()
     out["datetime"] = pd.to_datetime(out["datetime"], utc=True)
     out.sort_values("datetime", inplace=True)
     out.reset_index(drop=True, inplace=True)
-    out.to_parquet(path, engine="pyarrow", compression="zstd")
 
-def ensure_market_history(symbol: str, start, api=True) -> pd.DataFrame | None:
+    # атомарная запись: читатели (в т.ч. другие процессы) не видят недописанный файл;
+    # hash считается по ходу записи, файл повторно не читается
+    tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with market_index.HashingFile(tmp) as f:
+        write_market_parquet(out, f)
+    digest = f.hexdigest()
+    os.replace(tmp, path)
+
+    # индекс покрытия и кэш загрузчика обновляются сразу, без ожидания stat следующего чтения
+    LOADER_CACHE.invalidate(str(path))
+    market_index.update(
+        symbol,
+        min_ns=int(out["datetime"].iat[0].value) if len(out) else None,
+        max_ns=int(out["datetime"].iat[-1].value) if len(out) else None,
+        rows=int(len(out)),
+        mtime_ns=path.stat().st_mtime_ns,
+        hash=digest,
+    )
+    if bar_store.BAR_BACKEND in ("npy", "panel") and len(out):
+        dt_ns, ohlc = frame_to_bars(out)
+        if bar_store.BAR_BACKEND == "npy":
+            bar_store.write_bars(symbol, dt_ns, ohlc, digest)
+        else:
+            panel_store.queue_symbol(symbol, dt_ns, ohlc, digest)
+
+def merge_market(local: pd.DataFrame | None, fresh: pd.DataFrame) -> pd.DataFrame:
+    """Локальная история + ответ API: дубликаты по datetime берутся из свежих данных."""
+    if local is None or local.empty:
+        return fresh
+    fresh = fresh.copy()
+    fresh["datetime"] = pd.to_datetime(fresh["datetime"], utc=True)
+    merged = pd.concat([local, fresh], ignore_index=True)
+    merged.drop_duplicates("datetime", keep="last", inplace=True)
+    merged.sort_values("datetime", inplace=True)
+    merged.reset_index(drop=True, inplace=True)
+    return merged
+
+def _same_frame(local: pd.DataFrame | None, merged: pd.DataFrame) -> bool:
+    """merge_market ничего не добавил и не изменил (те же строки, колонки и значения)."""
+    if local is None or len(local) != len(merged) or not local.columns.equals(merged.columns):
+        return False
+    return local.reset_index(drop=True).equals(merged)
+
+def _to_ns(t) -> int:
+    ts = pd.Timestamp(t)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize("UTC")
+    return int(ts.value)
+
+def _bars_between(t0_ns: int, t1_ns: int) -> int:
+    """Верхняя оценка числа баров BAR_MINUTES между моментами (по календарному времени)."""
+    if t1_ns <= t0_ns:
+        return 0
+    return int(math.ceil((t1_ns - t0_ns) / (BAR_MINUTES * 60 * 1_000_000_000)))
+
+def history_gaps(symbol: str, start, end=None) -> tuple[bool, bool]:
+    """
+    (не хватает головы, не хватает хвоста) истории символа относительно [start, end].
+    Решается по индексу покрытия, без чтения файла данных.
+    Голова не считается недостающей, если API уже отдал всё, что у него есть (api_earliest_ns);
+    хвост — если синхронизация была не раньше end (synced_ns).
+    """
+    cov = market_index.coverage(symbol)
+    if cov is None or not cov.get("rows"):
+        return True, False
+    first_ns, last_ns = cov["min_ns"], cov["max_ns"]
+
+    head = first_ns > _to_ns(start)
+    if head and cov.get("api_earliest_ns") is not None and first_ns <= cov["api_earliest_ns"]:
+        head = False
+
+    tail = False
+    if end is not None:
+        end_ns = _to_ns(end)
+        tail = last_ns < end_ns and cov.get("synced_ns", 0) < end_ns
+    return head, tail
+
+def ensure_market_history(symbol: str, start, api=True, end=None) -> pd.DataFrame | None:
+    """
+    История символа, покрывающая [start, end] (end=None — хвост не проверяется).
+    API отдаёт последние limit баров, поэтому limit считается по тому, чего не хватает:
+    только хвост — бары после последнего локального; голова — до start плюс уже имеющиеся.
+    limit не больше API_MAX_LIMIT. Ответ сливается с локальным файлом (ничего старого не теряется)
+    и пишется атомарно — только если что-то добавилось или поменялось; synced_ns обновляется всегда.
+    Запись индекса уходит на диск с market_index.flush.
+    """
+    head, tail = history_gaps(symbol, start, end)
     df = load_market(symbol)
+    if not api or not (head or tail):
+        return df
 
-    if df is not None:
-        if df["datetime"].min() <= start or not api:
-            return df
+    now_ns = pd.Timestamp.now(tz="UTC").value
+    if df is None or df.empty:
+        limit = max(DEFAULT_LIMIT, _bars_between(_to_ns(start), now_ns))
     else:
-        if not api:
-            return None
+        first_ns = int(df["datetime"].iat[0].value)
+        last_ns = int(df["datetime"].iat[-1].value)
+        limit = _bars_between(last_ns, now_ns) + TAIL_MARGIN
+        if head:
+            limit += len(df) + _bars_between(_to_ns(start), first_ns)
+    limit = min(limit, API_MAX_LIMIT)
 
     # ⬇️ догружаем через API
-    limit = 15000
-    if df is not None and len(df) > limit * 0.8:
-        limit += 5000
     api_df = fetch_market_data(symbol, limit)
     if api_df is None or api_df.empty:
         return df
 
-    save_market(symbol, api_df)
-    return ensure_market_history(symbol, start, api=False)
+    merged = merge_market(df, api_df)
+    # ничего нового — файл (а с ним npy/панель, mtime и кэши) не трогаем
+    if not _same_frame(df, merged):
+        save_market(symbol, merged)
+
+    synced = {"synced_ns": int(now_ns)}
+    # API отдаёт только последние limit баров: если вернул меньше, чем просили,
+    # или просили максимум — раньше этого бара он сейчас ничего не даст
+    if len(api_df) < limit or limit == API_MAX_LIMIT:
+        synced["api_earliest_ns"] = _to_ns(api_df["datetime"].min())
+    market_index.update(symbol, **synced)
+    return load_market(symbol)
@@ -0,0 +1,254 @@
+import argparse
+import atexit
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from loader import market_index
+from loader.cache import cached
+
+# панель: бары всех символов подряд в двух файлах + индекс symbol -> (offset, length)
+#   dt_ns.<gen>.bin  int64 [rows]
+#   ohlc.<gen>.bin   float64 [rows, 4]
+#   index.json       {"gen", "rows", "symbols": {symbol: {offset, length, source_hash, bars_hash}}}
+# Запись только дописыванием в конец: старые offset'ы остаются валидными для читателей,
+# перезаписанный символ просто указывает на новый диапазон (мусор убирает compact).
+PANEL_PATH = Path("data/panel")
+INDEX_FILE = PANEL_PATH / "index.json"
+
+# символов в одной пачке дописывания: одна запись индекса на пачку, память — не больше пачки
+APPEND_BATCH = 256
+
+_lock = threading.RLock()
+_pending = []   # очередь queue_symbol: [(symbol, dt_ns, ohlc, source_hash)]
+
+
+def _dt_file(gen: int) -> Path:
+    return PANEL_PATH / f"dt_ns.{gen}.bin"
+
+
+def _ohlc_file(gen: int) -> Path:
+    return PANEL_PATH / f"ohlc.{gen}.bin"
+
+
+@contextmanager
+def _writer_lock():
+    """Один писатель на панель: поток (RLock) + процесс (flock)."""
+    PANEL_PATH.mkdir(parents=True, exist_ok=True)
+    with _lock, open(PANEL_PATH / ".lock", "w") as fh:
+        try:
+            import fcntl
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        except ImportError:
+            pass
+        yield
+
+
+def _read_index_file() -> dict:
+    if not INDEX_FILE.exists():
+        return {"gen": 0, "rows": 0, "symbols": {}}
+    return json.loads(INDEX_FILE.read_text())
+
+
+def _write_index_file(index: dict):
+    tmp = INDEX_FILE.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(index, sort_keys=True))
+    os.replace(tmp, INDEX_FILE)
+
+
+def append_symbols(items) -> int:
+    """
+    Дописывает символы в конец панели: items — [(symbol, dt_ns, ohlc, source_hash)].
+    Одна запись индекса на весь вызов. Возвращает число записанных символов.
+    """
+    from loader.market_loader import bars_hash
+
+    with _writer_lock():
+        index = _read_index_file()
+        gen, rows = index["gen"], index["rows"]
+        written = 0
+        with open(_dt_file(gen), "ab") as f_dt, open(_ohlc_file(gen), "ab") as f_ohlc:
+            # в файлах может быть недописанный хвост упавшей записи — пишем строго после rows
+            f_dt.truncate(rows * 8)
+            f_ohlc.truncate(rows * 32)
+            for symbol, dt_ns, ohlc, source_hash in items:
+                n = int(dt_ns.shape[0])
+                f_dt.write(np.ascontiguousarray(dt_ns, dtype=np.int64).tobytes())
+                f_ohlc.write(np.ascontiguousarray(ohlc, dtype=np.float64).tobytes())
+                index["symbols"][symbol] = {
+                    "offset": rows, "length": n, "source_hash": source_hash, "bars_hash": bars_hash(dt_ns, ohlc),
+                }
+                rows += n
+                written += 1
+            f_dt.flush()
+            f_ohlc.flush()
+            os.fsync(f_dt.fileno())
+            os.fsync(f_ohlc.fileno())
+        index["rows"] = rows
+        # индекс меняется последним: до этого читатели видят прежнюю панель
+        _write_index_file(index)
+        return written
+
+
+def queue_symbol(symbol: str, dt_ns: np.ndarray, ohlc: np.ndarray, source_hash: str | None = None):
+    """
+    Ставит символ в очередь дописывания (save_market при prefetch): fsync и запись индекса —
+    одна на flush, а не на символ. До flush читатели берут бары символа из parquet (hash не совпал).
+    """
+    with _lock:
+        _pending.append((symbol, dt_ns, ohlc, source_hash))
+        full = len(_pending) >= APPEND_BATCH
+    if full:
+        flush()
+
+
+def flush() -> int:
+    """Дописывает очередь queue_symbol одной пачкой; возвращает число символов."""
+    global _pending
+    with _lock:
+        items, _pending = _pending, []
+        return append_symbols(items) if items else 0
+
+
+atexit.register(flush)
+
+
+@cached
+def _open_panel(path_str: str, mtime_ns: int) -> tuple[dict, np.ndarray, np.ndarray]:
+    index = json.loads(Path(path_str).read_text())
+    rows = int(index["rows"])
+    if rows == 0:
+        return index, np.empty(0, dtype=np.int64), np.empty((0, 4), dtype=np.float64)
+    gen = index["gen"]
+    # один mmap на файл для всей панели; срезы символов — view без копирования
+    dt_all = np.memmap(_dt_file(gen), dtype=np.int64, mode="r", shape=(rows,)).view(np.ndarray)
+    ohlc_all = np.memmap(_ohlc_file(gen), dtype=np.float64, mode="r", shape=(rows, 4)).view(np.ndarray)
+    return index, dt_all, ohlc_all
+
+
+def open_panel() -> tuple[dict, np.ndarray, np.ndarray] | None:
+    """(index, dt_ns всех баров, ohlc всех баров) либо None, если панели нет."""
+    if not INDEX_FILE.exists():
+        return None
+    return _open_panel(str(INDEX_FILE), INDEX_FILE.stat().st_mtime_ns)
+
+
+@cached
+def _panel_slice(path_str: str, mtime_ns: int, symbol: str) -> tuple[np.ndarray, np.ndarray] | None:
+    index, dt_all, ohlc_all = _open_panel(path_str, mtime_ns)
+    entry = index["symbols"].get(symbol)
+    if entry is None:
+        return None
+    lo, hi = entry["offset"], entry["offset"] + entry["length"]
+    return dt_all[lo:hi], ohlc_all[lo:hi]
+
+
+def _fresh_entry(symbol: str, check_source: bool = True) -> tuple[str, int, dict] | None:
+    if not INDEX_FILE.exists():
+        return None
+    path_str, mtime_ns = str(INDEX_FILE), INDEX_FILE.stat().st_mtime_ns
+    entry = _open_panel(path_str, mtime_ns)[0]["symbols"].get(symbol)
+    if entry is None:
+        return None
+    if check_source:
+        cov = market_index.coverage(symbol)
+        if cov is not None and entry.get("source_hash") != cov.get("hash"):
+            return None
+    return path_str, mtime_ns, entry
+
+
+def load_bars(symbol: str, check_source: bool = True) -> tuple[np.ndarray, np.ndarray] | None:
+    """
+    (dt_ns, ohlc) символа — view в панель (panel[offset:offset + length]) либо None.
+    check_source: None и при несовпадении с текущим parquet (hash из market_index).
+    """
+    fresh = _fresh_entry(symbol, check_source)
+    if fresh is None:
+        return None
+    return _panel_slice(fresh[0], fresh[1], symbol)
+
+
+def load_stamp(symbol: str) -> tuple[int, str] | None:
+    """(строк, bars_hash) актуальной записи символа в панели либо None."""
+    fresh = _fresh_entry(symbol)
+    if fresh is None or fresh[2].get("bars_hash") is None:
+        return None
+    return int(fresh[2]["length"]), fresh[2]["bars_hash"]
+
+
+def compact() -> dict:
+    """Переписывает панель без мусора (устаревших версий символов) в новое поколение файлов."""
+    with _writer_lock():
+        index = _read_index_file()
+        old_gen, rows = index["gen"], index["rows"]
+        if rows == 0:
+            return {"rows_before": 0, "rows_after": 0}
+        dt_all = np.memmap(_dt_file(old_gen), dtype=np.int64, mode="r", shape=(rows,))
+        ohlc_all = np.memmap(_ohlc_file(old_gen), dtype=np.float64, mode="r", shape=(rows, 4))
+
+        gen = old_gen + 1
+        new_rows = 0
+        symbols = {}
+        with open(_dt_file(gen), "wb") as f_dt, open(_ohlc_file(gen), "wb") as f_ohlc:
+            # по возрастанию offset: чтение старых файлов последовательное
+            for symbol, entry in sorted(index["symbols"].items(), key=lambda kv: kv[1]["offset"]):
+                lo, hi = entry["offset"], entry["offset"] + entry["length"]
+                f_dt.write(dt_all[lo:hi].tobytes())
+                f_ohlc.write(ohlc_all[lo:hi].tobytes())
+                symbols[symbol] = dict(entry, offset=new_rows)
+                new_rows += entry["length"]
+            os.fsync(f_dt.fileno())
+            os.fsync(f_ohlc.fileno())
+
+        _write_index_file({"gen": gen, "rows": new_rows, "symbols": symbols})
+        # открытые mmap старого поколения у читателей остаются валидными и после unlink
+        _dt_file(old_gen).unlink(missing_ok=True)
+        _ohlc_file(old_gen).unlink(missing_ok=True)
+        return {"rows_before": rows, "rows_after": new_rows}
+
+
+def build_from_parquet(symbols=None, force: bool = False) -> dict:
+    """Дописывает в панель символы из data/ohlc, которых в ней нет или чей parquet изменился."""
+    from loader.market_loader import MARKET_PATH, load_market_bars_parquet
+
+    symbols = symbols or [p.stem for p in sorted(MARKET_PATH.glob("*.parquet"))]
+    stats = {"appended": flush(), "fresh": 0, "missing": 0}
+    items = []
+    for symbol in symbols:
+        if not force and load_bars(symbol) is not None:
+            stats["fresh"] += 1
+            continue
+        bars = load_market_bars_parquet(symbol)
+        if bars is None:
+            stats["missing"] += 1
+            continue
+        cov = market_index.coverage(symbol)
+        items.append((symbol, bars[0], bars[1], cov.get("hash") if cov else None))
+        if len(items) >= APPEND_BATCH:
+            stats["appended"] += append_symbols(items)
+            items = []
+    if items:
+        stats["appended"] += append_symbols(items)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Консолидированная панель баров всех символов")
+    parser.add_argument("--build", action="store_true", help="дописать новые/изменённые символы из parquet")
+    parser.add_argument("--force", action="store_true", help="с --build: переписать все символы")
+    parser.add_argument("--compact", action="store_true", help="убрать устаревшие версии символов")
+    parser.add_argument("--symbols", type=str, default=None, help="список через запятую, по умолчанию все")
+    args = parser.parse_args()
+
+    symbols = [s.strip() for s in args.symbols.split(",") if s.strip()] if args.symbols else None
+    if args.build:
+        print(f"Panel build: {build_from_parquet(symbols, force=args.force)}")
+    if args.compact:
+        print(f"Panel compact: {compact()}")
+    panel = open_panel()
+    if panel is not None:
+        print(f"Panel: {len(panel[0]['symbols'])} symbols, {panel[0]['rows']} rows (gen {panel[0]['gen']})")
@@ -0,0 +1,96 @@
+import argparse
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from core.market_time import build_market_cache, add_market_minutes_cached_many, last_closed_bar_cached
+from loader import api_client, instrument_map, market_index, panel_store
+from loader.indicator_bank import signal_symbol_ranges
+from loader.market_loader import BAR_MINUTES, ensure_market_history, history_gaps
+
+
+def needs_fetch(symbol: str, start, end=None) -> bool:
+    """Та же проверка, что в ensure_market_history."""
+    return any(history_gaps(symbol, start, end))
+
+
+def _fetch_one(symbol: str, start, end=None) -> str:
+    df = ensure_market_history(symbol, start, end=end)
+    if df is None or df.empty:
+        return "missing"
+    return "fetched"
+
+
+def symbol_windows(signals, holding_minutes: int = 0) -> dict[str, tuple[pd.Timestamp, pd.Timestamp]]:
+    """
+    symbol -> (первый сигнал, последний сигнал + holding_minutes рыночных минут);
+    конец не позже начала последнего закрытого бара: будущих баров API не отдаст, а в выходные,
+    праздники и между барами повторный прогон после синхронизации ничего не догружает.
+    """
+    ranges = signal_symbol_ranges(signals)
+    if not ranges:
+        return {}
+    symbols = list(ranges)
+    last_ns = np.array([ranges[s][1].value for s in symbols], dtype=np.int64)
+    cache = build_market_cache(
+        pd.Timestamp(int(last_ns.min()), tz="UTC"), pd.Timestamp(int(last_ns.max()), tz="UTC"),
+        extra_days=max(60, int(holding_minutes / 390) * 2 + 30),
+    )
+    now = pd.Timestamp.now(tz="UTC")
+    # 10 дней до now в кэше с запасом покрывают любые выходные с праздниками
+    closed_ns = last_closed_bar_cached(now.value, BAR_MINUTES, build_market_cache(now, now, extra_days=1))
+    end_ns = np.minimum(add_market_minutes_cached_many(last_ns, int(holding_minutes), cache), closed_ns)
+    return {s: (ranges[s][0], pd.Timestamp(int(e), tz="UTC")) for s, e in zip(symbols, end_ns)}
+
+
+def prefetch_market(signals, workers: int = 8, holding_minutes: int = 0) -> dict:
+    """
+    Догружает OHLC всех символов сигналов до бэктеста: недостающие/короткие —
+    параллельно в workers потоков через общую сессию api_client (пул, повторы, rate limit).
+    Покрытие — от первого сигнала символа до последнего плюс holding_minutes (хвост для выхода).
+    После этого backtest работает только с локальными файлами.
+    """
+    t0 = time.perf_counter()
+    windows = symbol_windows(signals, holding_minutes)
+    todo = {symbol: window for symbol, window in windows.items() if needs_fetch(symbol, *window)}
+
+    stats = {"symbols": len(windows), "local": len(windows) - len(todo), "fetched": 0, "missing": 0, "failed": 0}
+    if todo:
+        # ограниченный параллелизм: не больше соединений, чем в пуле сессии
+        workers = max(1, min(int(workers), api_client.POOL_SIZE, len(todo)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_fetch_one, symbol, *window): symbol for symbol, window in todo.items()}
+            for fut in as_completed(futures):
+                try:
+                    stats[fut.result()] += 1
+                except Exception as e:
+                    logging.warning(f"Prefetch: {futures[fut]} failed: {e}")
+                    stats["failed"] += 1
+        # карта инструментов, индекс покрытия и панель пишутся один раз на прогон, а не на каждый символ
+        instrument_map.flush()
+        market_index.flush()
+        panel_store.flush()
+
+    stats["seconds"] = round(time.perf_counter() - t0, 3)
+    return stats
+
+
+if __name__ == "__main__":
+    from loader.signals import load_signals
+
+    parser = argparse.ArgumentParser(description="Параллельная догрузка OHLC для символов сигналов")
+    parser.add_argument("--signals", type=str, default="data/signals/signals.csv")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--holding_minutes", type=int, default=0, help="хвост после последнего сигнала символа")
+    parser.add_argument("--rate", type=float, default=0.0, help="запросов в секунду, 0 — без лимита")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--base_url", type=str, default=None, help="например http://127.0.0.1:8000")
+    args = parser.parse_args()
+
+    api_client.configure(base_url=args.base_url, pool_size=max(args.workers, 1),
+                         retries=args.retries, rate_limit=args.rate)
+    stats = prefetch_market(load_signals(args.signals), workers=args.workers, holding_minutes=args.holding_minutes)
+    print(f"Prefetch: {stats}")
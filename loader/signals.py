@@ -1,26 +1,126 @@
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
 
+DATETIME_FORMAT = "%d.%m.%Y %H:%M:%S"
+
+LONG = 1
+SHORT = -1
+
+
+@dataclass
+class SignalTable:
+    """
+    Сигналы в длинном формате: одна строка = (сигнал, символ, направление).
+    Строки упорядочены как в файле: по сигналу, внутри — long, затем short.
+    Индексация/итерация отдают прежние dict {"datetime", "long", "short"}.
+    """
+    datetime: pd.DatetimeIndex  # по сигналу, UTC
+    signal_id: np.ndarray       # int64, неубывающий
+    symbol: np.ndarray          # object (str)
+    direction: np.ndarray       # int8: 1 long, -1 short
+
+    def __post_init__(self):
+        # границы строк каждого сигнала: [bounds[i], bounds[i + 1])
+        self.bounds = np.searchsorted(self.signal_id, np.arange(len(self.datetime) + 1))
+
+    @property
+    def datetime_ns(self) -> np.ndarray:
+        return self.datetime.asi8
+
+    def counts(self) -> np.ndarray:
+        """Число символов в каждом сигнале."""
+        return np.diff(self.bounds)
+
+    def __len__(self) -> int:
+        return len(self.datetime)
+
+    def __getitem__(self, i) -> dict:
+        lo, hi = self.bounds[i], self.bounds[i + 1]
+        symbols, directions = self.symbol[lo:hi], self.direction[lo:hi]
+        return {
+            "datetime": self.datetime[i],
+            "long": list(symbols[directions == LONG]),
+            "short": list(symbols[directions == SHORT]),
+        }
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    @classmethod
+    def from_records(cls, signals) -> "SignalTable":
+        """Из прежнего списка dict {"datetime", "long", "short"}."""
+        dts, sids, symbols, directions = [], [], [], []
+        for i, signal in enumerate(signals):
+            dts.append(signal.get("datetime"))
+            for name, code in (("long", LONG), ("short", SHORT)):
+                for symbol in signal.get(name, []):
+                    sids.append(i)
+                    symbols.append(symbol)
+                    directions.append(code)
+        return cls(
+            datetime=pd.DatetimeIndex(pd.to_datetime(dts, utc=True)),
+            signal_id=np.asarray(sids, dtype=np.int64),
+            symbol=np.asarray(symbols, dtype=object),
+            direction=np.asarray(directions, dtype=np.int8),
+        )
+
+
+def as_signal_table(signals) -> SignalTable:
+    return signals if isinstance(signals, SignalTable) else SignalTable.from_records(signals)
+
+
+def _explode_symbols(col: pd.Series) -> pd.Series:
+    """Тикеры колонки по строкам: индекс — номер сигнала, порядок как в ячейке."""
+    values = col.dropna()
+    if len(values) and isinstance(values.iat[0], (list, tuple, np.ndarray)):
+        parts = col  # parquet со списками
+    else:
+        parts = col.astype("string").str.split(",")
+    symbols = parts.explode().dropna().astype(str).str.strip()
+    return symbols[symbols != ""]
+
+
+def _parse_datetime(col: pd.Series) -> pd.DatetimeIndex:
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return pd.DatetimeIndex(pd.to_datetime(col, utc=True))
+    # один разбор по явному формату
+    return pd.DatetimeIndex(pd.to_datetime(col, format=DATETIME_FORMAT, utc=True))
+
+
+def load_signals(path: str) -> SignalTable:
+    """CSV (;, datetime в DATETIME_FORMAT) или parquet; колонки long_symbols/short_symbols либо symbols."""
+    if Path(path).suffix == ".parquet":
+        df = pd.read_parquet(path, engine="pyarrow")
+    else:
+        df = pd.read_csv(path, sep=";", dtype=str, keep_default_na=True)
+    df.reset_index(drop=True, inplace=True)
+
+    long_col = "long_symbols" if "long_symbols" in df.columns else "symbols"
+    parts = []
+    if long_col in df.columns:
+        parts.append((_explode_symbols(df[long_col]), LONG))
+    if "short_symbols" in df.columns:
+        parts.append((_explode_symbols(df["short_symbols"]), SHORT))
+
+    if parts:
+        symbols = pd.concat([s for s, _ in parts])
+        directions = np.concatenate([np.full(len(s), code, dtype=np.int8) for s, code in parts])
+        # стабильная сортировка по сигналу: long раньше short, порядок тикеров сохраняется
+        order = np.argsort(symbols.index.to_numpy(), kind="stable")
+        signal_id = symbols.index.to_numpy(dtype=np.int64)[order]
+        symbol = symbols.to_numpy(dtype=object)[order]
+        direction = directions[order]
+    else:
+        signal_id = np.empty(0, dtype=np.int64)
+        symbol = np.empty(0, dtype=object)
+        direction = np.empty(0, dtype=np.int8)
 
-def _split_symbols(x) -> list[str]:
-    if x is None or (isinstance(x, float) and pd.isna(x)):
-        return []
-    return [s.strip() for s in str(x).split(",") if s.strip()]
-
-def load_signals(path: str):
-    df = pd.read_csv(path, sep=";", parse_dates=["datetime"])
-    df["datetime"] = pd.to_datetime(df["datetime"], format='%d.%m.%Y %H:%M:%S', utc=True)
-
-    has_long = "long_symbols" in df.columns
-    has_short = "short_symbols" in df.columns
-    
-    signals = []
-    for _, row in df.iterrows():
-        long_symbols = _split_symbols(row["long_symbols"]) if has_long else _split_symbols(row.get("symbols"))
-        short_symbols = _split_symbols(row["short_symbols"]) if has_short else []
-
-        signals.append({
-            "datetime": row["datetime"],
-            "long": long_symbols,
-            "short": short_symbols,
-        })
-    return signals
+    return SignalTable(
+        datetime=_parse_datetime(df["datetime"]),
+        signal_id=signal_id,
+        symbol=symbol,
+        direction=direction,
+    )
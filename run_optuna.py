@@ -1,4 +1,5 @@
 import argparse
+import time
 import optuna
 
 import warnings
@@ -8,20 +9,32 @@ warnings.filterwarnings(
 )
 
 from loader.signals import load_signals
-from core.baskets import backtest
+from loader.prefetch import prefetch_market
+from loader import api_client
+from core.baskets import backtest, backtest_grid
 from core.metrics import compute_metrics
-from config.params import build_optuna_params
+from config.params import build_optuna_params, StrategyParams
 from utils.save import save_optimization_results
 from utils.cli import str_to_bool
 from core.early_stopping import EarlyStopper
+from core.entry_cache import EntryCache
+from config.params import indicator_search_columns
+from loader.indicator_bank import warm_indicator_bank
+import loader.ensure_data as ensure_data
+from loader.cache import LOADER_CACHE
 
 SIGNALS_PATH = "data/signals/signals.csv"
 
-def objective(trial: optuna.trial.Trial, args, signals):
+def objective(trial: optuna.trial.Trial, args, signals, entry_cache=None):
     params = build_optuna_params(trial, args)
 
-    trades, _ = backtest(signals, params)
+    trades, _ = backtest(signals, params, entry_cache=entry_cache)
 
+    return score_trial(trial, args, params, trades)
+
+
+def score_trial(trial: optuna.trial.Trial, args, params, trades) -> float:
+    """Метрики + user attrs трайла по готовым сделкам; возвращает score."""
     ua = {}
 
     if not trades:
@@ -50,28 +63,14 @@ def objective(trial: optuna.trial.Trial, args, signals):
 
 
     try:
-        total = 0
-        sl_n = tp_n = ts_n = time_n = psar_n = unk_n = 0
-
-        for t in trades:
-            if t.get("rejected"):
-                continue
-            r = t.get("exit_reason")
-            if r is None:
-                continue
-            total += 1
-            if r == "sl":
-                sl_n += 1
-            elif r == "tp":
-                tp_n += 1
-            elif r == "ts":
-                ts_n += 1
-            elif r == "time_exit":
-                time_n += 1
-            elif r == "psar":
-                psar_n += 1
-            else:
-                unk_n += 1
+        counts = trades.reason_counts()
+        total = len(trades)
+        sl_n = counts.get("sl", 0)
+        tp_n = counts.get("tp", 0)
+        ts_n = counts.get("ts", 0)
+        time_n = counts.get("time_exit", 0)
+        psar_n = counts.get("psar", 0)
+        unk_n = counts.get("unknown", 0)
 
         if total > 0:
             ua["exit_sl_frac"] = sl_n / total
@@ -114,6 +113,31 @@ def objective(trial: optuna.trial.Trial, args, signals):
     return float(metrics.get("score", -1e9))
 
 
+def optimize_batched(study, args, signals, entry_cache, stopper):
+    """
+    ask/tell пачками по args.trial_batch трайлов: трайлы с одинаковыми входами
+    (EntryCache.key) считаются одним backtest_grid — каждая сделка проходит бары один раз
+    для всех их sl/tp/holding/PSAR/TS. constant_liar в TPE разводит трайлы пачки.
+    """
+    done = 0
+    while done < args.n_trials:
+        trials = [study.ask() for _ in range(min(args.trial_batch, args.n_trials - done))]
+        groups = {}
+        for trial in trials:
+            params = build_optuna_params(trial, args)
+            groups.setdefault(EntryCache.key(params), []).append((trial, params))
+
+        stop = False
+        for group in groups.values():
+            results = backtest_grid(signals, [p for _, p in group], entry_cache=entry_cache)
+            for (trial, params), (trades, _) in zip(group, results):
+                study.tell(trial, score_trial(trial, args, params, trades))
+                stop = stopper.update(study) or stop
+        done += len(trials)
+        if stop:
+            break
+
+
 def run():
     parser = argparse.ArgumentParser()
 
@@ -145,8 +169,19 @@ def run():
 
     parser.add_argument("--ema_use", type=str_to_bool, default=False)
     parser.add_argument("--rsi_use", type=str_to_bool, default=False)
+    # заранее посчитать все EMA/RSI пространства поиска, трайлы — только чтение
+    parser.add_argument("--warm_indicators", type=str_to_bool, default=False)
 
     parser.add_argument("--n_trials", type=int, default=300)
+    # >1: трайлы пачками через ask/tell, общие входы считаются одной сеткой конфигов выхода
+    parser.add_argument("--trial_batch", type=int, default=1)
+
+    parser.add_argument("--threads", type=int, default=StrategyParams.threads)  # см. StrategyParams.threads
+
+    # догрузка OHLC до бэктеста: параллельно, через пул соединений
+    parser.add_argument("--prefetch", type=str_to_bool, default=True)
+    parser.add_argument("--prefetch_workers", type=int, default=8)
+    parser.add_argument("--api_rate", type=float, default=0.0) # запросов/сек, 0 = без лимита
 
     # --- Objective tuning knobs ---
     parser.add_argument("--trades_target", type=int, default=800)
@@ -164,6 +199,18 @@ def run():
 
     # Загружаем сигналы один раз
     signals = load_signals(args.signals)
+    if args.prefetch:
+        api_client.configure(rate_limit=args.api_rate)
+        stats = prefetch_market(signals, workers=args.prefetch_workers,
+                                holding_minutes=args.delay_open_max + args.holding_minutes_max)
+        print(f"Prefetch: {stats}")
+    if args.warm_indicators and (args.ema_use or args.rsi_use):
+        stats = warm_indicator_bank(signals, indicator_search_columns())
+        print(f"Indicator bank: {stats}")
+        ensure_data.PERSIST_INDICATORS = False
+
+    # входы/фильтры общие для трайлов с одинаковыми delay_open и индикаторами
+    entry_cache = EntryCache()
 
     # optuna.logging.disable_default_handler()
 
@@ -179,12 +226,19 @@ def run():
     )
 
     study = optuna.create_study(direction="maximize", sampler=sampler)
-    # study.optimize(make_objective(args), n_trials=args.n_trials)
-    study.optimize(
-        lambda t: objective(t, args, signals), 
-        callbacks=[EarlyStopper(patience=60, warmup=40)], 
-        n_trials=args.n_trials
-    )
+    stopper = EarlyStopper(patience=60, warmup=40)
+    # время — на весь study, а не на каждый backtest в цикле трайлов
+    start_time = time.time()
+    if args.trial_batch > 1:
+        optimize_batched(study, args, signals, entry_cache, stopper)
+    else:
+        # study.optimize(make_objective(args), n_trials=args.n_trials)
+        study.optimize(
+            lambda t: objective(t, args, signals, entry_cache), 
+            callbacks=[stopper], 
+            n_trials=args.n_trials
+        )
+    print(f"Время ({len(study.trials)} трайлов): {(time.time() - start_time):.4f} секунд")
 
     try:
         save_optimization_results(study, args.signals)
@@ -195,6 +249,12 @@ def run():
     for k, v in study.best_trial.params.items():
         print(f"{k:25}: {v}")
     print("Score:", study.best_value)
+    print(f"Entry cache: {len(entry_cache)} keys, {entry_cache.hits} hits / {entry_cache.misses} misses")
+    ci = LOADER_CACHE.info()
+    print(
+        f"Loader cache: {ci['entries']} entries, {ci['bytes'] / 2**20:.1f}/{ci['max_bytes'] / 2**20:.0f} MiB, "
+        f"{ci['hits']} hits / {ci['misses']} misses / {ci['evictions']} evictions"
+    )
 
 
 if __name__ == "__main__":
@@ -1,10 +1,13 @@
 import argparse
+import time
 import pandas as pd
 
 from loader.signals import load_signals
+from loader.prefetch import prefetch_market
+from loader import api_client
 from core.baskets import backtest
 from core.metrics import compute_metrics
-from config.params import build_single_params
+from config.params import build_single_params, StrategyParams
 from utils.save import save_csv
 from utils.cli import str_to_bool
 
@@ -38,17 +41,32 @@ def main(save=True):
     parser.add_argument("--rsi_level", type=int, default=50)
     parser.add_argument("--rsi_period", type=int, default=18)
 
+    parser.add_argument("--threads", type=int, default=StrategyParams.threads)  # см. StrategyParams.threads
+
+    # догрузка OHLC до бэктеста: параллельно, через пул соединений
+    parser.add_argument("--prefetch", type=str_to_bool, default=True)
+    parser.add_argument("--prefetch_workers", type=int, default=8)
+    parser.add_argument("--api_rate", type=float, default=0.0) # запросов/сек, 0 = без лимита
+
     args = parser.parse_args()
 
     params = build_single_params(args)
 
     signals = load_signals(args.signals)
+    if args.prefetch:
+        api_client.configure(rate_limit=args.api_rate)
+        stats = prefetch_market(signals, workers=args.prefetch_workers,
+                                holding_minutes=args.delay_open + args.holding_minutes)
+        print(f"Prefetch: {stats}")
+
+    start_time = time.time()
     trades, signal_stats = backtest(signals, params)
+    print(f"Время: {(time.time() - start_time):.4f} секунд")
 
     metrics = compute_metrics(trades, params)
 
     if save:
-        save_csv(pd.DataFrame(trades), "trades.csv", args.signals)
+        save_csv(trades.to_frame(), "trades.csv", args.signals)
         save_csv(pd.DataFrame(signal_stats), "signals.csv", args.signals)
         save_csv(pd.DataFrame([params]), "params.csv", args.signals)
         save_csv(pd.DataFrame([metrics]), "summary.csv", args.signals)
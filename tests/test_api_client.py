@@ -0,0 +1,96 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("pandas")
+pytest.importorskip("dotenv")
+
+from loader import api_client
+
+
+class _Server:
+    """Локальный сервер-заглушка: отдаёт ответы из очереди script, потом 200; пишет время каждой попытки."""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.hits = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                self.rfile.read(length)
+                server.hits.append(time.monotonic())
+                status, headers = server.script.pop(0) if server.script else (200, {})
+                body = json.dumps({"result": []}).encode()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = _reply
+            do_POST = _reply
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def client():
+    saved = (api_client.BASE_URL, api_client.RETRIES, api_client.BACKOFF, api_client.RATE_LIMIT)
+    yield api_client
+    base_url, retries, backoff, rate = saved
+    api_client.configure(retries=retries, backoff=backoff, rate_limit=rate)
+    api_client.BASE_URL = base_url
+
+
+def test_retries_on_5xx_and_429_with_retry_after(client):
+    with _Server([(503, {}), (429, {"Retry-After": "0.3"})]) as server:
+        client.configure(base_url=server.url, retries=3, backoff=0.0, rate_limit=0)
+        response = client._request("POST", "/api/marketData/addChartSymbols", json={}, timeout=5)
+
+    assert response.status_code == 200
+    assert len(server.hits) == 3
+    # Retry-After соблюдён между 429 и следующей попыткой
+    assert server.hits[2] - server.hits[1] >= 0.3
+
+
+def test_gives_up_after_retries(client):
+    import requests
+
+    with _Server([(503, {})] * 5) as server:
+        client.configure(base_url=server.url, retries=2, backoff=0.0, rate_limit=0)
+        with pytest.raises(requests.HTTPError):
+            client._request("GET", "/api/marketData/symbolSearch/", timeout=5)
+
+    assert len(server.hits) == 3
+
+
+def test_rate_limit_covers_every_attempt(client):
+    rate = 10.0
+    with _Server([(503, {}), (502, {})]) as server:
+        client.configure(base_url=server.url, retries=3, backoff=0.0, rate_limit=rate)
+        client._request("GET", "/api/marketData/symbolSearch/", timeout=5)
+        client._request("GET", "/api/marketData/symbolSearch/", timeout=5)
+
+    # 2 повтора + 2 успешных запроса, все через лимитер
+    assert len(server.hits) == 4
+    gaps = [b - a for a, b in zip(server.hits, server.hits[1:])]
+    assert min(gaps) >= 0.9 / rate
@@ -0,0 +1,23 @@
+import argparse
+
+from loader.signals import load_signals
+from loader.indicator_bank import warm_indicator_bank
+from config.params import indicator_search_columns
+
+SIGNALS_PATH = "data/signals/signals.csv"
+
+def main():
+    parser = argparse.ArgumentParser(description="Прогрев банка индикаторов под пространство поиска Optuna")
+    parser.add_argument("--signals", type=str, default=SIGNALS_PATH)
+    args = parser.parse_args()
+
+    columns = indicator_search_columns()
+    signals = load_signals(args.signals)
+    stats = warm_indicator_bank(signals, columns)
+
+    print(f"Колонок: {len(columns)} ({', '.join(columns)})")
+    for k, v in stats.items():
+        print(f"{k:15}: {v}")
+
+if __name__ == "__main__":
+    main()